@@ -2,19 +2,36 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime
+import plotly.io as pio
+from plotly.subplots import make_subplots
+from datetime import datetime, timezone
 import time
-
-# Page configuration
-st.set_page_config(
-    page_title="PhoneHub - AI Phone Recommendations",
-    page_icon="📱",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+import os
+import sys
+import argparse
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import math
+import re
+import hashlib
+import ast
+import json
+import sqlite3
+import queue
+import atexit
+import heapq
+from functools import cached_property
+from itertools import chain
+from types import MappingProxyType
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.ipc
+import pyarrow.parquet as pq
 
 # Custom CSS for immersive dark mode with neon effects
-st.markdown("""
+PAGE_CSS = """
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
     
@@ -233,11 +250,22 @@ st.markdown("""
         }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+def setup_page():
+    """Configure the Streamlit page and inject the theme CSS"""
+    # Page configuration
+    st.set_page_config(
+        page_title="PhoneHub - AI Phone Recommendations",
+        page_icon="📱",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 # Phone database
-@st.cache_data
-def load_phone_data():
+def load_builtin_phone_data():
+    """Return the built-in sample catalog used when no catalog file is configured"""
     phones = [
         {
             "name": "iPhone 15 Pro Max",
@@ -432,392 +460,2468 @@ def load_phone_data():
     ]
     return pd.DataFrame(phones)
 
-# Recommendation engine
-def get_recommendations(df, budget, primary_use, brand_pref=None, min_camera=0, min_battery=0):
-    filtered_df = df[df['price'] <= budget].copy()
-    
-    if brand_pref and brand_pref != "Any":
-        filtered_df = filtered_df[filtered_df['brand'] == brand_pref]
-    
-    if min_camera > 0:
-        filtered_df = filtered_df[filtered_df['camera'] >= min_camera]
-    
-    if min_battery > 0:
-        filtered_df = filtered_df[filtered_df['battery'] >= min_battery]
-    
-    # Scoring based on primary use
-    if primary_use == "Photography":
-        filtered_df['score'] = (filtered_df['camera'] * 0.5 + 
-                               filtered_df['display'] * 0.3 + 
-                               filtered_df['performance'] * 0.2)
-    elif primary_use == "Gaming":
-        filtered_df['score'] = (filtered_df['performance'] * 0.5 + 
-                               filtered_df['display'] * 0.3 + 
-                               filtered_df['battery'] * 0.2)
-    elif primary_use == "Battery Life":
-        filtered_df['score'] = (filtered_df['battery'] * 0.5 + 
-                               filtered_df['performance'] * 0.3 + 
-                               filtered_df['camera'] * 0.2)
-    else:  # General Use
-        filtered_df['score'] = (filtered_df['performance'] * 0.3 + 
-                               filtered_df['camera'] * 0.25 + 
-                               filtered_df['battery'] * 0.25 + 
-                               filtered_df['display'] * 0.2)
-    
-    return filtered_df.sort_values('score', ascending=False)
+# Catalog sources
+CATALOG_ENV_VAR = "PHONEHUB_CATALOG"
+REQUIRED_CATALOG_COLUMNS = ['name', 'price', 'camera', 'battery', 'performance', 'display', 'brand']
+OPTIONAL_CATALOG_COLUMNS = {
+    'category': "", 'storage': "", 'ram': "", 'screen_size': "", 'camera_mp': "",
+    'battery_mah': "", 'os': "", 'features': (), 'pros': (), 'cons': ()
+}
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
 
-def generate_explanation(phone, primary_use, budget):
-    explanations = []
-    
-    if primary_use == "Photography":
-        if phone['camera'] >= 90:
-            explanations.append(f"📸 Exceptional camera quality ({phone['camera']}/100) perfect for photography enthusiasts")
-        elif phone['camera'] >= 80:
-            explanations.append(f"📸 Very good camera ({phone['camera']}/100) suitable for most photography needs")
-    
-    elif primary_use == "Gaming":
-        if phone['performance'] >= 90:
-            explanations.append(f"🎮 Top-tier performance ({phone['performance']}/100) handles any game smoothly")
-        elif phone['performance'] >= 80:
-            explanations.append(f"🎮 Good gaming performance ({phone['performance']}/100) for most mobile games")
-    
-    elif primary_use == "Battery Life":
-        if phone['battery'] >= 85:
-            explanations.append(f"🔋 Excellent battery life ({phone['battery']}/100) for all-day usage")
-        elif phone['battery'] >= 75:
-            explanations.append(f"🔋 Good battery life ({phone['battery']}/100) for regular usage")
-    
-    if phone['price'] <= budget * 0.8:
-        explanations.append(f"💰 Great value at ${phone['price']} - well within your ${budget} budget")
-    elif phone['price'] <= budget * 0.9:
-        explanations.append(f"💰 Good value at ${phone['price']} for the features offered")
-    
-    if len(phone['features']) > 0:
-        explanations.append(f"✨ Key features: {', '.join(phone['features'][:3])}")
-    
-    return explanations
+def read_catalog_table(path):
+    """Read a Parquet or Arrow IPC catalog file into an Arrow table.
 
-# Main app
-def main():
-    # Header
-    st.markdown('<h1 class="main-header">📱 PhoneHub</h1>', unsafe_allow_html=True)
-    st.markdown('<p class="subtitle">AI-Powered Phone Recommendations Tailored Just for You</p>', unsafe_allow_html=True)
-    
-    # Load data
-    df = load_phone_data()
-    
-    # Sidebar filters
-    st.sidebar.markdown("## 🎯 Find Your Perfect Phone")
-    
-    budget = st.sidebar.slider("💰 Budget (USD)", 300, 1500, 800, 50)
-    primary_use = st.sidebar.selectbox("🎯 Primary Use", 
-                                      ["General Use", "Photography", "Gaming", "Battery Life"])
-    brand_pref = st.sidebar.selectbox("📱 Brand Preference", 
-                                     ["Any"] + sorted(df['brand'].unique().tolist()))
-    
-    st.sidebar.markdown("### Advanced Filters")
-    min_camera = st.sidebar.slider("📸 Minimum Camera Score", 0, 100, 0, 5)
-    min_battery = st.sidebar.slider("🔋 Minimum Battery Score", 0, 100, 0, 5)
-    
-    # Store filters in session state for use in focus_on_selected_phone
-    st.session_state['budget'] = budget
-    st.session_state['primary_use'] = primary_use
-    st.session_state['brand_pref'] = brand_pref
-    st.session_state['min_camera'] = min_camera
-    st.session_state['min_battery'] = min_battery
-    
-    # Show recently viewed phones in sidebar
-    show_recently_viewed(df)
-    
-    # Get recommendations
-    recommendations = get_recommendations(df, budget, primary_use, brand_pref, min_camera, min_battery)
-    
-    # Main content
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3 style="color: #00f5ff; margin: 0;">💰</h3>
-            <p style="color: white; margin: 0;">Budget</p>
-            <p style="color: #00ff88; font-size: 1.2rem; margin: 0;">${budget}</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3 style="color: #00f5ff; margin: 0;">🎯</h3>
-            <p style="color: white; margin: 0;">Primary Use</p>
-            <p style="color: #00ff88; font-size: 1.2rem; margin: 0;">{primary_use}</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3 style="color: #00f5ff; margin: 0;">📱</h3>
-            <p style="color: white; margin: 0;">Brand</p>
-            <p style="color: #00ff88; font-size: 1.2rem; margin: 0;">{brand_pref}</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown(f"""
-        <div class="metric-card">
-            <h3 style="color: #00f5ff; margin: 0;">📊</h3>
-            <p style="color: white; margin: 0;">Found</p>
-            <p style="color: #00ff88; font-size: 1.2rem; margin: 0;">{len(recommendations)} phones</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Focus on selected phone if set
-    focus_on_selected_phone(df)
-    
-    if len(recommendations) == 0:
-        st.markdown("""
-        <div class="neon-card">
-            <h3 style="color: #ff6b6b; text-align: center;">No phones found matching your criteria</h3>
-            <p style="color: #a0a0a0; text-align: center;">Try adjusting your filters or increasing your budget</p>
-        </div>
-        """, unsafe_allow_html=True)
-        return
-    
-    # Display recommendations
-    st.markdown("## 🏆 Recommended Phones")
-    
-    for idx, (_, phone) in enumerate(recommendations.head(5).iterrows()):
-        explanations = generate_explanation(phone, primary_use, budget)
-        # Add to recently viewed
-        add_recently_viewed(phone['name'])
-        # Create radar chart for phone specs
-        categories = ['Camera', 'Battery', 'Performance', 'Display']
-        values = [phone['camera'], phone['battery'], phone['performance'], phone['display']]
-        fig = go.Figure()
-        fig.add_trace(go.Scatterpolar(
-            r=values,
-            theta=categories,
-            fill='toself',
-            name=phone['name'],
-            line=dict(color='#00f5ff', width=2),
-            fillcolor='rgba(0, 245, 255, 0.2)'
-        ))
-        fig.update_layout(
-            polar=dict(
-                radialaxis=dict(
-                    visible=True,
-                    range=[0, 100],
-                    gridcolor='rgba(255, 255, 255, 0.2)',
-                    color='white'
-                ),
-                angularaxis=dict(
-                    gridcolor='rgba(255, 255, 255, 0.2)',
-                    color='white'
-                )
-            ),
-            showlegend=False,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white', size=12),
-            height=300
-        )
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            rank_badge = "🥇" if idx == 0 else "🥈" if idx == 1 else "🥉" if idx == 2 else f"#{idx+1}"
-            st.markdown(f"""
-            <div class="phone-card">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
-                    <div>
-                        <span style="font-size: 1.5rem; margin-right: 0.5rem;">{rank_badge}</span>
-                        <span class="phone-name">{phone['name']}</span>
-                    </div>
-                    <span class="price">${phone['price']}</span>
-                </div>
-                <div class="phone-details">
-                    <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(120px, 1fr)); gap: 1rem; margin-bottom: 1rem;">
-                        <div>📱 <strong>{phone['screen_size']}</strong></div>
-                        <div>💾 <strong>{phone['storage']}</strong></div>
-                        <div>🧠 <strong>{phone['ram']}</strong></div>
-                        <div>📸 <strong>{phone['camera_mp']}</strong></div>
-                        <div>🔋 <strong>{phone['battery_mah']}</strong></div>
-                        <div>🤖 <strong>{phone['os']}</strong></div>
-                    </div>
-                    <div style="margin-bottom: 1rem;">
-                        <strong style="color: #00f5ff;">✨ Key Features:</strong><br>
-                        {' • '.join(phone['features'])}
-                    </div>
-                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
-                        <div>
-                            <strong style="color: #00ff88;">👍 Pros:</strong><br>
-                            {'<br>'.join(['• ' + pro for pro in phone['pros']])}
-                        </div>
-                        <div>
-                            <strong style="color: #ff6b6b;">👎 Cons:</strong><br>
-                            {'<br>'.join(['• ' + con for con in phone['cons']])}
-                        </div>
-                    </div>
-                </div>
-                <div class="explanation">
-                    <strong>🤖 Why this phone is perfect for you:</strong><br>
-                    {'<br>'.join(['• ' + exp for exp in explanations])}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        with col2:
-            st.plotly_chart(fig, use_container_width=True)
-    
-    # --- New Feature: Compare Two Devices by Name ---
-    st.markdown("## 🤝 Compare Any Two Devices")
-    st.info("Enter the names of any two devices from the database to compare them side by side.")
-    colA, colB = st.columns(2)
-    with colA:
-        device1 = st.text_input("Device 1 Name", "iPhone 15 Pro Max")
-    with colB:
-        device2 = st.text_input("Device 2 Name", "Samsung Galaxy S24 Ultra")
-    compare_btn = st.button("Compare Devices")
-    if compare_btn:
-        df1 = df[df['name'].str.lower() == device1.strip().lower()]
-        df2 = df[df['name'].str.lower() == device2.strip().lower()]
-        if df1.empty or df2.empty:
-            st.error("One or both device names not found. Please check spelling or try another device.")
+    Arrow IPC files are memory-mapped, so the numeric column buffers point
+    straight at the OS page cache and every process that opens the same file
+    shares those pages. Parquet has to be decoded into private memory; use
+    convert_catalog_to_arrow() once to get the shareable layout.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        table = pq.read_table(path, memory_map=True)
+    elif extension in ARROW_EXTENSIONS:
+        source = pa.memory_map(path, 'r')
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            source.seek(0)
+            table = pa.ipc.open_stream(source).read_all()
+    else:
+        raise ValueError(f"Unsupported catalog format '{extension}' for {path} (expected Parquet or Arrow IPC)")
+
+    missing = [column for column in REQUIRED_CATALOG_COLUMNS if column not in table.column_names]
+    if missing:
+        raise ValueError(f"Catalog {path} is missing required columns: {', '.join(missing)}")
+    return table
+
+def convert_catalog_to_arrow(source_path, target_path):
+    """Rewrite a Parquet or Arrow catalog as a single-chunk, uncompressed Arrow IPC file.
+
+    The catalog is ingested before writing, so the file already holds the
+    compact typed columns and readers can map them without parsing.
+    """
+    df = ingest_catalog(catalog_table_to_frame(read_catalog_table(source_path)))
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    with pa.OSFile(target_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return target_path
+
+def catalog_table_to_frame(table):
+    """Convert a catalog table to the DataFrame layout the app expects"""
+    # split_blocks keeps one block per column so primitive columns stay
+    # zero-copy views over the memory map instead of being consolidated
+    return _fill_optional_columns(table.to_pandas(split_blocks=True))
+
+def _fill_optional_columns(df):
+    for column, default in OPTIONAL_CATALOG_COLUMNS.items():
+        if column not in df.columns:
+            df[column] = [list(default) for _ in range(len(df))] if isinstance(default, tuple) else default
+    return df
+
+@st.cache_resource(show_spinner=False)
+def _load_catalog_file(path, modified_ns):
+    df = ingest_catalog(catalog_table_to_frame(read_catalog_table(path)))
+    df.attrs['catalog_version'] = f"{path}@{modified_ns}"
+    return df
+
+@st.cache_resource(show_spinner=False)
+def _load_builtin_catalog():
+    df = ingest_catalog(load_builtin_phone_data())
+    df.attrs['catalog_version'] = "builtin"
+    return df
+
+def load_phone_data(catalog_path=None):
+    """Load the phone catalog from a Parquet/Arrow file, falling back to the built-in list.
+
+    The catalog path comes from the argument or the PHONEHUB_CATALOG
+    environment variable. Loaded catalogs are cached as a shared resource, so
+    every session and rerun reuses one read-only frame instead of a private copy.
+    The frame's attrs['catalog_version'] identifies the loaded file and mtime.
+    """
+    path = catalog_path or os.environ.get(CATALOG_ENV_VAR)
+    if path:
+        return _load_catalog_file(os.path.abspath(path), os.stat(path).st_mtime_ns)
+    return _load_builtin_catalog()
+
+# Catalog ingest
+SCORE_COLUMNS = ['camera', 'battery', 'performance', 'display']
+CATEGORICAL_COLUMNS = ['brand', 'category', 'os']
+SIZE_UNITS_GB = {'TB': 1024, 'GB': 1, 'MB': 1 / 1024}
+THOUSANDS_SEPARATOR = re.compile(r'(?<=\d)[,_](?=\d{3}(?!\d))')
+
+# column -> (dtype, unit multipliers, display suffix); sizes are float GB so 512MB RAM stays 0.5
+NUMERIC_SPEC_COLUMNS = {
+    'storage': ('float32', SIZE_UNITS_GB, 'GB'),
+    'ram': ('float32', SIZE_UNITS_GB, 'GB'),
+    'screen_size': ('float32', None, '"'),
+    'camera_mp': ('int16', None, 'MP'),
+    'battery_mah': ('int32', None, 'mAh'),
+}
+
+def _parse_spec_column(values, dtype, units=None):
+    """Extract the number from display strings like '256GB', '6.7"' or '5,000mAh'"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values if _is_stored_as(values, dtype) else values.fillna(0).astype(dtype)
+    text = values.astype(str).str.replace(THOUSANDS_SEPARATOR, '', regex=True)
+    parts = text.str.extract(r'(\d+(?:\.\d+)?)\s*([A-Za-z]*)')
+    numbers = pd.to_numeric(parts[0], errors='coerce')
+    if units:
+        numbers = numbers * parts[1].str.upper().map(units).fillna(1)
+    return numbers.fillna(0).round(4).astype(dtype)
+
+def _is_stored_as(values, dtype):
+    """True when a column already has dtype and no nulls, so ingest can keep it (and its memory map) as is"""
+    return values.dtype == dtype and not values.hasnans
+
+def ingest_catalog(df):
+    """Turn a raw catalog into compact typed columns, once per catalog load.
+
+    Spec strings become int16/int32/float32 numbers, brand/category/os become
+    categoricals and the 0-100 score columns are narrowed to int8. Display
+    strings are rebuilt only at render time with format_spec_columns().
+    Columns that already have their target type (as in a file written by
+    convert_catalog_to_arrow()) are kept, so they stay memory-mapped.
+    """
+    df = df.copy(deep=False)
+    for column, (dtype, units, _) in NUMERIC_SPEC_COLUMNS.items():
+        df[column] = _parse_spec_column(df[column], dtype, units)
+    for column in SCORE_COLUMNS:
+        values = df[column]
+        if not (_is_stored_as(values, 'int8') and values.between(0, 100).all()):
+            df[column] = pd.to_numeric(values, errors='coerce').fillna(0).clip(0, 100).astype('int8')
+    if not (_is_stored_as(df['price'], 'int32') or _is_stored_as(df['price'], 'float32')):
+        price = pd.to_numeric(df['price'], errors='coerce').fillna(0)
+        df['price'] = price.astype('int32') if (price % 1 == 0).all() else price.astype('float32')
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype('category')
+    return df
+
+def format_storage(gigabytes):
+    """Render a storage or RAM size in GB as a display string"""
+    if gigabytes >= 1024 and gigabytes % 1024 == 0:
+        return f"{gigabytes / 1024:.10g}TB"
+    if gigabytes < 1:
+        return f"{round(float(gigabytes) * 1024)}MB"
+    return f"{float(gigabytes):.10g}GB"
+
+def format_spec_columns(frame):
+    """Return a copy of frame with the numeric spec columns rendered as display strings"""
+    frame = frame.copy()
+    for column, (_, _, suffix) in NUMERIC_SPEC_COLUMNS.items():
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if column in ('storage', 'ram'):
+            text = values.map(format_storage)
         else:
-            compare_df = pd.concat([df1, df2])
-            st.markdown("### 📊 Device Comparison Table")
-            st.dataframe(compare_df[['name','price','camera','battery','performance','display','storage','ram','screen_size','os']], use_container_width=True, hide_index=True)
-            # Visual comparison
-            st.markdown("### 📈 Visual Comparison")
-            fig = go.Figure()
-            for _, row in compare_df.iterrows():
-                fig.add_trace(go.Bar(
-                    x=['Camera','Battery','Performance','Display'],
-                    y=[row['camera'], row['battery'], row['performance'], row['display']],
-                    name=row['name']
-                ))
-            fig.update_layout(
-                barmode='group',
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white'),
-                title_font=dict(color='#00f5ff', size=16),
-                title="Specs Comparison"
-            )
-            st.plotly_chart(fig, use_container_width=True)
-    
-    # Add filter summary
-    add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery)
-    # Add comparison section
-    add_comparison_section(recommendations)
-    # Add search functionality
-    add_search_functionality(df)
-    # Export functionality
-    export_recommendations(recommendations)
-    # Add feedback section
-    st.markdown("## 💬 Feedback")
-    col1, col2 = st.columns(2)
-    with col1:
-        rating = st.select_slider(
-            "How helpful were these recommendations?",
-            options=['😞 Not helpful', '😐 Somewhat helpful', '😊 Very helpful', '🤩 Extremely helpful'],
-            value='😊 Very helpful'
-        )
-    with col2:
-        feedback = st.text_area("Any additional feedback or suggestions?", height=100)
-        if st.button("Submit Feedback"):
-            st.success("Thank you for your feedback! It helps us improve our recommendations.")
-    # Analytics section
-    st.markdown("## 📊 Market Analysis")
-    col1, col2 = st.columns(2)
-    with col1:
-        fig_scatter = px.scatter(
-            df, x='price', y='performance', 
-            color='brand', size='camera',
-            hover_data=['name', 'battery', 'display'],
-            title="Price vs Performance Analysis"
-        )
-        fig_scatter.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white'),
-            title_font=dict(color='#00f5ff', size=16)
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
-    with col2:
-        brand_counts = df['brand'].value_counts()
-        fig_pie = px.pie(
-            values=brand_counts.values, 
-            names=brand_counts.index,
-            title="Brand Distribution"
-        )
-        fig_pie.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white'),
-            title_font=dict(color='#00f5ff', size=16)
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
-    # Footer
-    st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #a0a0a0; padding: 2rem;">
-        <p>🚀 Built with Streamlit • Powered by AI • Made with 💙 for tech enthusiasts</p>
-        <p>© 2024 PhoneHub - Your Ultimate Phone Recommendation Assistant</p>
-    </div>
-    """, unsafe_allow_html=True)
+            text = values.astype(str) + suffix
+        frame[column] = text.where(values > 0, "N/A")
+    return frame
 
-# Additional features and improvements for PhoneHub
+# Scoring profiles
+PROFILE_WEIGHTS = {
+    "General Use": {'performance': 0.3, 'camera': 0.25, 'battery': 0.25, 'display': 0.2},
+    "Photography": {'camera': 0.5, 'display': 0.3, 'performance': 0.2},
+    "Gaming": {'performance': 0.5, 'display': 0.3, 'battery': 0.2},
+    "Battery Life": {'battery': 0.5, 'performance': 0.3, 'camera': 0.2},
+}
+DEFAULT_PROFILE = "General Use"
+CUSTOM_PROFILE = "Custom"
+RECOMMENDATION_LIMIT = 50
+STAIRCASE_DEPTH = RECOMMENDATION_LIMIT
+DIRECT_SCORING_LIMIT = 50_000
+THRESHOLD_BATCH_SIZE = 256
+PROFILES_ENV_VAR = "PHONEHUB_PROFILES"
+PROFILE_RELOAD_SECONDS = 1.0   # how often the profile config file is checked for changes
+WEIGHTS_ENV_VAR = "PHONEHUB_WEIGHTS"
+WEIGHTS_FORMAT_VERSION = 1
 
-# Add after the main function, before if __name__ == "__main__":
+# Columns profile expressions may use; tie-breakers can also use the profile's own `score`
+PROFILE_VARIABLES = SCORE_COLUMNS + ['price', 'ram', 'storage', 'battery_mah']
+PROFILE_FUNCTIONS = {'min': np.minimum, 'max': np.maximum, 'abs': np.abs, 'sqrt': np.sqrt, 'log': np.log,
+                     'clip': np.clip}
+PROFILE_OPERATORS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+                     ast.Pow: np.power, ast.USub: np.negative, ast.UAdd: np.positive}
 
-def create_comparison_table(phones_df):
-    """Create a detailed comparison table for selected phones"""
-    if len(phones_df) == 0:
-        return None
-    
-    comparison_data = []
-    for _, phone in phones_df.iterrows():
-        comparison_data.append({
-            'Phone': phone['name'],
-            'Price': f"${phone['price']}",
-            'Camera Score': f"{phone['camera']}/100",
-            'Battery Score': f"{phone['battery']}/100",
-            'Performance': f"{phone['performance']}/100",
-            'Display': f"{phone['display']}/100",
-            'Storage': phone['storage'],
-            'RAM': phone['ram'],
-            'Screen Size': phone['screen_size'],
-            'Overall Score': f"{phone['score']:.1f}/100" if 'score' in phone else "N/A"
-        })
-    
-    return pd.DataFrame(comparison_data)
+def compile_expression(text, variables=PROFILE_VARIABLES):
+    """Compile an arithmetic expression over column names into a vectorized evaluator.
 
-def add_comparison_section(recommendations):
-    """Add a comparison section for top phones"""
-    if len(recommendations) > 1:
-        st.markdown("## 🔍 Detailed Comparison")
-        
-        # Allow user to select phones for comparison
-        phone_names = recommendations['name'].tolist()
-        selected_phones = st.multiselect(
-            "Select phones to compare (max 3):",
-            phone_names,
-            default=phone_names[:3] if len(phone_names) >= 3 else phone_names
-        )
-        
-        if selected_phones:
-            selected_data = recommendations[recommendations['name'].isin(selected_phones)]
-            comparison_df = create_comparison_table(selected_data)
-            
-            if comparison_df is not None:
-                st.dataframe(
-                    comparison_df,
-                    use_container_width=True,
-                    hide_index=True
-                )
-                
-                # Add comparison charts
-                col1, col2 = st.columns(2)
+    Only numbers, the given names, + - * / ** and PROFILE_FUNCTIONS are
+    accepted, so a config file cannot run arbitrary code. Returns
+    (evaluate, names used), where evaluate maps a {name: array} dict to an
+    array.
+    """
+    used = set()
+
+    def build(node):
+        if isinstance(node, ast.Expression):
+            return build(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = float(node.value)
+            return lambda values: value
+        if isinstance(node, ast.Name) and node.id in variables:
+            used.add(node.id)
+            return lambda values: values[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in PROFILE_OPERATORS:
+            operator, left, right = PROFILE_OPERATORS[type(node.op)], build(node.left), build(node.right)
+            return lambda values: operator(left(values), right(values))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in PROFILE_OPERATORS:
+            operator, operand = PROFILE_OPERATORS[type(node.op)], build(node.operand)
+            return lambda values: operator(operand(values))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in PROFILE_FUNCTIONS
+                and not node.keywords):
+            function, arguments = PROFILE_FUNCTIONS[node.func.id], [build(argument) for argument in node.args]
+            return lambda values: function(*[argument(values) for argument in arguments])
+        raise ValueError(f"Unsupported syntax in profile expression {text!r}: {ast.unparse(node)}")
+
+    return build(ast.parse(text, mode='eval')), used
+
+class ScoringProfile:
+    """One profile from the config, compiled to vectorized score and tie-break evaluators.
+
+    spec is {'weights': {score column: weight}, 'terms': [{'expression',
+    'weight'}], 'tie_breakers': [expression, ...]}. The score is the
+    normalized weighted sum of the score columns plus each term's weighted
+    expression. Phones with equal scores are ordered by ascending
+    tie-breaker values (negate one for descending), then by row. The
+    fingerprint changes exactly when the spec does.
+    """
+
+    def __init__(self, name, spec):
+        unknown = set(spec) - {'weights', 'terms', 'tie_breakers', 'description'}
+        if unknown:
+            raise ValueError(f"Profile {name!r}: unknown keys {sorted(unknown)}")
+        self.name = name
+        self.spec = spec
+        weights = spec.get('weights', {})
+        if set(weights) - set(SCORE_COLUMNS):
+            raise ValueError(f"Profile {name!r}: weights must be over {SCORE_COLUMNS}")
+        self.weights = normalize_weights(weights) if weights else np.zeros(len(SCORE_COLUMNS))
+        self.terms = [(float(term['weight']), *compile_expression(term['expression']))
+                      for term in spec.get('terms', [])]
+        if not weights and not self.terms:
+            raise ValueError(f"Profile {name!r} needs weights or terms")
+        self.tie_breakers = [compile_expression(expression, PROFILE_VARIABLES + ['score'])
+                             for expression in spec.get('tie_breakers', [])]
+        self.fingerprint = hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+        # Evaluate once on a single dummy row so wrong arities fail here rather than mid-request
+        self.evaluate({column: np.ones(1) for column in PROFILE_VARIABLES})
+
+    @staticmethod
+    def _values(columns, names):
+        with np.errstate(all='ignore'):
+            return {name: columns[name].astype(np.float64) for name in names}
+
+    def evaluate(self, columns):
+        """Score every row of a {column: array} mapping; returns (float32 scores, tie-break keys or None)"""
+        # Accumulate in float64 and round once, so scores do not depend on BLAS summation order
+        scores = np.zeros(len(columns['price']))
+        for weight, column in zip(self.weights, SCORE_COLUMNS):
+            if weight > 0:
+                scores += weight * columns[column]
+        scores = scores.astype(np.float32)
+        with np.errstate(all='ignore'):
+            for weight, evaluate, names in self.terms:
+                term = np.nan_to_num(np.broadcast_to(evaluate(self._values(columns, names)), scores.shape),
+                                     nan=0.0, posinf=0.0, neginf=0.0)
+                scores += np.float32(weight) * term.astype(np.float32)
+            if not self.tie_breakers:
+                return scores, None
+            keys = []
+            for evaluate, names in self.tie_breakers:
+                values = self._values(columns, names - {'score'})
+                values['score'] = scores.astype(np.float64)
+                keys.append(np.broadcast_to(evaluate(values), scores.shape))
+        # Rank every row by (tie-breakers..., row); top_k_rows() compares these ranks instead of row ids
+        order = np.lexsort([np.arange(len(scores))] + keys[::-1])
+        ranks = np.empty(len(scores), dtype=np.int64)
+        ranks[order] = np.arange(len(scores))
+        return scores, ranks
+
+def load_profile_weights(path, defaults):
+    """Overlay the weights in a `tune-weights` file on defaults; returns (weights, file version)"""
+    with open(path) as f:
+        tuned = json.load(f)
+    if tuned.get('format') != WEIGHTS_FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported weights file format {tuned.get('format')!r}")
+    weights = dict(defaults)
+    for profile, entry in tuned['profiles'].items():
+        if profile in weights:
+            weights[profile] = {column: float(weight) for column, weight in entry['weights'].items()
+                                if column in SCORE_COLUMNS and weight > 0}
+    return weights, tuned['version']
+
+class ProfileRegistry:
+    """The scoring profiles, compiled from a JSON config and reloaded when the file changes.
+
+    The config is {'default': name, 'profiles': {name: spec}} (see
+    ScoringProfile); without a file the built-in PROFILE_WEIGHTS are used.
+    Tuned weights from $PHONEHUB_WEIGHTS are laid over the config's. The
+    file's mtime is checked at most every PROFILE_RELOAD_SECONDS. A reload
+    only swaps in the new profiles, and caches keyed by a profile's
+    fingerprint go stale just for the profiles whose spec changed. An edit
+    that fails to compile keeps the previous profiles and is reported in
+    self.error. The default name and the profile map are swapped together as
+    one immutable tuple, so readers never see one without the other.
+    """
+
+    def __init__(self, path=None, weights_path=None):
+        self.path = path
+        self.weights_path = weights_path
+        self.weights_version = "builtin"
+        self.error = None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self._stamp = os.stat(path).st_mtime_ns if path else None
+        self._state = self._compile()
+
+    @property
+    def default(self):
+        return self._state[0]
+
+    @property
+    def profiles(self):
+        return self._state[1]
+
+    def _compile(self):
+        if self.path:
+            with open(self.path) as f:
+                config = json.load(f)
+        else:
+            config = {'default': DEFAULT_PROFILE,
+                      'profiles': {name: {'weights': weights} for name, weights in PROFILE_WEIGHTS.items()}}
+        specs = {name: dict(spec) for name, spec in config['profiles'].items()}
+        if not specs:
+            raise ValueError("The profile config defines no profiles")
+        if self.weights_path:
+            tuned, self.weights_version = load_profile_weights(
+                self.weights_path, {name: spec.get('weights', {}) for name, spec in specs.items()})
+            for name, weights in tuned.items():
+                if weights:
+                    specs[name]['weights'] = weights
+        profiles = MappingProxyType({name: ScoringProfile(name, spec) for name, spec in specs.items()})
+        default = config.get('default', DEFAULT_PROFILE)
+        return default if default in profiles else next(iter(profiles)), profiles
+
+    def refresh(self):
+        """Reload the config if its file changed; returns the names of the profiles that changed"""
+        if not self.path or time.monotonic() - self._checked < PROFILE_RELOAD_SECONDS:
+            return set()
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                stamp = os.stat(self.path).st_mtime_ns
+                if stamp == self._stamp:
+                    return set()
+                self._stamp = stamp
+                state = self._compile()
+            except (OSError, ValueError, KeyError, TypeError, SyntaxError) as error:
+                self.error = error
+                return set()
+            old, new = self.profiles, state[1]
+            changed = {name for name in old.keys() | new.keys()
+                       if name not in old or name not in new or old[name].fingerprint != new[name].fingerprint}
+            self._state, self.error = state, None
+            self.reloads += 1
+            return changed
+
+    def names(self):
+        self.refresh()
+        return list(self.profiles)
+
+    def get(self, name):
+        """The named profile, or the default one for unknown names"""
+        self.refresh()
+        default, profiles = self._state
+        return profiles.get(name) or profiles[default]
+
+@st.cache_resource(show_spinner=False)
+def get_profile_registry():
+    """The process-wide ProfileRegistry, configured from $PHONEHUB_PROFILES and $PHONEHUB_WEIGHTS"""
+    return ProfileRegistry(os.environ.get(PROFILES_ENV_VAR) or None, os.environ.get(WEIGHTS_ENV_VAR) or None)
+
+def _positive_minimums(minimums):
+    return {column: minimum for column, minimum in (minimums or {}).items() if minimum > 0}
+
+def normalize_weights(weights):
+    """Turn a {score column: weight} dict into a float64 vector over SCORE_COLUMNS summing to 1"""
+    vector = np.array([float(weights.get(column, 0)) for column in SCORE_COLUMNS])
+    if (vector < 0).any():
+        raise ValueError("Scoring weights must be non-negative")
+    if vector.sum() <= 0:
+        raise ValueError("At least one scoring weight must be positive")
+    return vector / vector.sum()
+
+def count_at_most(sorted_values, limit):
+    """Number of entries <= limit in an ascending array.
+
+    The limit is cast to the array's dtype first; np.searchsorted would
+    otherwise upcast (copy) the whole array on every call.
+    """
+    if len(sorted_values) == 0 or limit < sorted_values[0]:
+        return 0
+    if limit >= sorted_values[-1]:
+        return len(sorted_values)
+    if np.issubdtype(sorted_values.dtype, np.integer):
+        limit = math.floor(limit)
+    return int(np.searchsorted(sorted_values, sorted_values.dtype.type(limit), side='right'))
+
+class BudgetStaircase:
+    """Top-k answers for every budget of one profile, precomputed at the price breakpoints.
+
+    Walking the phones in price order, a phone can only ever appear in a
+    top-k result if it beats the k best cheaper phones when it arrives, and
+    it then stays out for good once it is beaten. Those arrivals are the
+    only breakpoints. They are stored with a snapshot of the top-k every
+    `depth` arrivals, so a budget-only query is one bisect plus a merge of
+    at most 2 * depth stored scores, with no scoring at all. Equal scores
+    are settled by ties[row] when the profile has tie-breakers, else by row.
+    """
+
+    BLOCK_SIZE = 4096
+
+    def __init__(self, rows, prices, scores, depth, ties=None):
+        self.depth = depth
+        self.ties = ties
+        heap = []
+        event_prices, event_rows, event_scores = [], [], []
+        snapshots = [np.empty(0, dtype=np.int64)]
+        for start in range(0, len(rows), self.BLOCK_SIZE):
+            block_rows = rows[start:start + self.BLOCK_SIZE]
+            block_scores = scores[block_rows]
+            if len(heap) == depth:
+                entering = np.flatnonzero(block_scores >= heap[0][0])
+            else:
+                entering = range(len(block_rows))
+            for i in entering:
+                row = int(block_rows[i])
+                entry = (float(block_scores[i]), -int(ties[row]) if ties is not None else -row, row)
+                if len(heap) < depth:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                else:
+                    continue
+                event_prices.append(prices[start + i])
+                event_rows.append(row)
+                event_scores.append(entry[0])
+                if len(event_rows) % depth == 0:
+                    snapshots.append(np.array([row for _, _, row in heap], dtype=np.int64))
+        self.event_prices = np.array(event_prices, dtype=prices.dtype)
+        self.event_rows = np.array(event_rows, dtype=np.int64)
+        self.event_scores = np.array(event_scores, dtype=np.float32)
+        self.snapshots = snapshots
+        self.scores = scores
+
+    def top_k(self, budget, k):
+        """Best k (<= depth) rows and scores among the phones priced at most budget"""
+        end = count_at_most(self.event_prices, budget)
+        checkpoint = end // self.depth
+        rows = np.concatenate([self.snapshots[checkpoint], self.event_rows[checkpoint * self.depth:end]])
+        return top_k_rows(rows, self.scores[rows], min(k, self.depth), self.ties)
+
+class CatalogIndex:
+    """Derived structures for one loaded catalog, built lazily and shared by every session"""
+
+    def __init__(self, df, version=None):
+        self.df = df
+        self.version = version
+        self._staircases = {}
+        self._profile_scores = {}
+
+    @cached_property
+    def name_search(self):
+        """NameSearchIndex over the phone names"""
+        return NameSearchIndex(self.df['name'])
+
+    @cached_property
+    def name_resolver(self):
+        """NameResolver for typed device names and shorthand"""
+        return NameResolver(self.df, lambda text: self.name_search.search(text, limit=2))
+
+    @cached_property
+    def feature_search(self):
+        """FeatureSearchIndex over the features, pros and cons lists"""
+        return FeatureSearchIndex(self.df)
+
+    @cached_property
+    def frontier_costs(self):
+        """frontier_costs() of every row"""
+        return frontier_costs(self.columns)
+
+    @cached_property
+    def value_frontier(self):
+        """Ascending row ids of the phones no cheaper phone beats on every score"""
+        return value_frontier(self.frontier_costs)
+
+    @cached_property
+    def dominance_tree(self):
+        """DominanceTree over price and the score columns"""
+        return DominanceTree(self.frontier_costs)
+
+    @cached_property
+    def market(self):
+        """MarketAggregates for the whole catalog"""
+        return MarketAggregates.from_frame(self.df)
+
+    @cached_property
+    def market_figures(self):
+        """Ready-made market analysis figures, built once per catalog version"""
+        return build_market_figures(self.df, self.market)
+
+    def profile_ranking(self, primary_use):
+        """(scores, tie-break ranks or None) of every row under a profile (unknown names get the default).
+
+        Each profile is evaluated on first use and kept with its fingerprint,
+        so a config reload recomputes only the profiles that changed.
+        """
+        profile = get_profile_registry().get(primary_use)
+        cached = self._profile_scores.get(profile.name)
+        if cached is None or cached[0] != profile.fingerprint:
+            cached = (profile.fingerprint, *profile.evaluate(self.columns))
+            self._profile_scores[profile.name] = cached
+        return cached[1:]
+
+    def profile_scores(self, primary_use):
+        """Scores of every row under a primary-use profile"""
+        return self.profile_ranking(primary_use)[0]
+
+    @cached_property
+    def columns(self):
+        """Plain numpy views of the filterable columns"""
+        return {column: self.df[column].to_numpy()
+                for column in ['price'] + SCORE_COLUMNS + ['ram', 'storage', 'battery_mah']}
+
+    @cached_property
+    def price_index(self):
+        """Row ids sorted by price plus the sorted prices, for bisecting a budget"""
+        order = np.argsort(self.columns['price'], kind='stable').astype(np.int32)
+        return order, self.columns['price'][order]
+
+    @cached_property
+    def brand_index(self):
+        """Per-brand posting lists ordered by price, plus each row's brand code.
+
+        Returns (postings, codes, brand_codes) where postings maps a brand to
+        (row ids, their sorted prices), so brand + budget is a single bisect.
+        """
+        codes, brands = pd.factorize(self.df['brand'])
+        prices = self.columns['price']
+        order = np.lexsort((prices, codes)).astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(len(brands) + 1))
+        postings = {}
+        for i, brand in enumerate(brands):
+            brand_rows = order[bounds[i]:bounds[i + 1]]
+            postings[brand] = (brand_rows, prices[brand_rows])
+        return postings, codes, {brand: i for i, brand in enumerate(brands)}
+
+    @cached_property
+    def score_buckets(self):
+        """Counting-sort order of each 0-100 score column with per-value offsets.
+
+        Rows scoring at least m on a column are order[offsets[m]:], so a
+        minimum-score filter is a slice rather than a scan.
+        """
+        buckets = {}
+        for column in SCORE_COLUMNS:
+            values = self.columns[column]
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(values[order], np.arange(102))
+            buckets[column] = (order, offsets)
+        return buckets
+
+    @cached_property
+    def attribute_order(self):
+        """Per score column: row ids in descending score order (ties by row) and the sorted scores"""
+        descending = {}
+        for column in SCORE_COLUMNS:
+            order = np.argsort(-self.columns[column].astype(np.int16), kind='stable').astype(np.int32)
+            descending[column] = (order, self.columns[column][order])
+        return descending
+
+    def weighted_scores(self, rows, weights):
+        """Score rows under a normalized weight vector from normalize_weights()"""
+        scores = np.zeros(len(rows))
+        for weight, column in zip(weights, SCORE_COLUMNS):
+            if weight > 0:
+                scores += weight * self.columns[column][rows]
+        return scores
+
+    def _unseen_ties(self, lists, stop, below):
+        """Rows under id below, at position >= stop of every threshold-algorithm list, scoring values[stop] in each"""
+        runs = []
+        for _, column, order, values in lists:
+            # The descending list holds score v at positions [n - offsets[v + 1], n - offsets[v]),
+            # ordered by row id
+            run = order[stop:len(order) - self.score_buckets[column][1][int(values[stop])]]
+            runs.append(run[:np.searchsorted(run, below)])
+        rows = min(runs, key=len)
+        for _, column, _, values in lists:
+            rows = rows[self.columns[column][rows] == values[stop]]
+        return rows
+
+    def weighted_top_k(self, weights, k, budget, brand_pref=None, min_scores=None, min_specs=None):
+        """Best k rows for arbitrary attribute weights, via Fagin's threshold algorithm.
+
+        The per-attribute descending lists are read in growing batches. Each
+        newly seen row is scored by random access and filtered, and the walk
+        stops once the k-th best score beats the threshold: the highest score
+        any unseen row could still reach. When the filters are selective (or
+        k is None) the candidate rows are scored directly instead.
+        """
+        weights = normalize_weights(weights)
+        if k is None or self.estimate_candidates(budget, brand_pref, min_scores) <= DIRECT_SCORING_LIMIT:
+            rows = self.candidate_rows(budget, brand_pref, min_scores, min_specs)
+            rows, scores = top_k_rows(rows, self.weighted_scores(rows, weights), k)
+            return rows, scores.astype(np.float32)
+
+        lists = [(weight, column, *self.attribute_order[column])
+                 for weight, column in zip(weights, SCORE_COLUMNS) if weight > 0]
+        seen = np.zeros(len(self.df), dtype=bool)
+        slot = np.empty(len(self.df), dtype=np.int32)
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0)
+        depth, batch = 0, THRESHOLD_BATCH_SIZE
+        while depth < len(self.df):
+            stop = min(depth + batch, len(self.df))
+            rows = np.concatenate([order[depth:stop] for _, _, order, _ in lists])
+            rows = rows[~seen[rows]]
+            # Drop rows reached through several lists in this batch without sorting
+            positions = np.arange(len(rows), dtype=np.int32)
+            slot[rows] = positions
+            rows = rows[slot[rows] == positions]
+            seen[rows] = True
+            rows = self.filter_rows(rows, budget, brand_pref, min_scores, min_specs)
+            best_rows, best_scores = top_k_rows(np.concatenate([best_rows, rows]),
+                                                np.concatenate([best_scores, self.weighted_scores(rows, weights)]), k)
+            if stop == len(self.df):
+                break
+            # Unseen rows sit at position >= stop in every list
+            threshold = sum(weight * float(values[stop]) for weight, _, _, values in lists)
+            if len(best_rows) == k and best_scores[-1] >= threshold:
+                if best_scores[-1] == threshold:
+                    # An unseen row reaches the threshold only by matching values[stop] in every list,
+                    # and it still wins the tie if its row id is below the last kept tie
+                    tied = self._unseen_ties(lists, stop, best_rows[best_scores == best_scores[-1]].max())
+                    tied = self.filter_rows(tied[~seen[tied]], budget, brand_pref, min_scores, min_specs)
+                    best_rows, best_scores = top_k_rows(np.concatenate([best_rows, tied]),
+                                                        np.concatenate([best_scores, self.weighted_scores(tied, weights)]), k)
+                break
+            depth, batch = stop, batch * 2
+        return best_rows, best_scores.astype(np.float32)
+
+    def count_in_budget(self, budget, brand_pref=None):
+        """Number of phones (of a brand) priced at most budget"""
+        return count_at_most(self.price_ordered_rows(brand_pref)[1], budget)
+
+    def _filter_lookups(self, budget, brand_pref=None, min_scores=None):
+        """Index slices for each indexed filter: name -> (size, function returning the rows)"""
+        order, prices = self.price_index
+        price_end = count_at_most(prices, budget)
+        lookups = {'price': (price_end, lambda: order[:price_end])}
+
+        if brand_pref and brand_pref != "Any":
+            postings = self.brand_index[0]
+            brand_rows, brand_prices = postings.get(brand_pref, (order[:0], prices[:0]))
+            brand_end = count_at_most(brand_prices, budget)
+            lookups['brand'] = (brand_end, lambda: brand_rows[:brand_end])
+
+        for column, minimum in _positive_minimums(min_scores).items():
+            score_order, offsets = self.score_buckets[column]
+            start = offsets[min(math.ceil(minimum), 101)]
+            lookups[column] = (len(score_order) - start,
+                               lambda score_order=score_order, start=start: score_order[start:])
+        return lookups
+
+    def estimate_candidates(self, budget, brand_pref=None, min_scores=None):
+        """Upper bound on the number of matching rows, from index slice sizes alone"""
+        return min(size for size, _ in self._filter_lookups(budget, brand_pref, min_scores).values())
+
+    def filter_mask(self, rows, budget, brand_pref=None, min_scores=None, min_specs=None, indexed=()):
+        """Boolean mask of the rows passing every filter (None when nothing needs checking)"""
+        checks = []
+        if 'price' not in indexed:
+            checks.append(self.columns['price'][rows] <= budget)
+        if brand_pref and brand_pref != "Any" and 'brand' not in indexed:
+            _, brand_codes, brand_lookup = self.brand_index
+            checks.append(brand_codes[rows] == brand_lookup.get(brand_pref, -1))
+        for column, minimum in _positive_minimums(min_scores).items():
+            if column not in indexed:
+                checks.append(self.columns[column][rows] >= minimum)
+        for column, minimum in _positive_minimums(min_specs).items():
+            checks.append(self.columns[column][rows] >= minimum)
+        if not checks:
+            return None
+        return np.logical_and.reduce(checks)
+
+    def filter_rows(self, rows, budget, brand_pref=None, min_scores=None, min_specs=None, indexed=()):
+        """Keep the rows passing every filter, skipping the filters named in indexed"""
+        mask = self.filter_mask(rows, budget, brand_pref, min_scores, min_specs, indexed)
+        return rows if mask is None else rows[mask]
+
+    def candidate_rows(self, budget, brand_pref=None, min_scores=None, min_specs=None):
+        """Row ids matching every filter, found from the indexes without a full-table scan.
+
+        Each indexed filter (price, brand within budget, minimum scores) yields
+        its matching rows as a slice whose size is known up front. The smallest
+        slice drives the lookup and the remaining predicates are checked on
+        just those rows.
+        """
+        lookups = self._filter_lookups(budget, brand_pref, min_scores)
+        driver = min(lookups, key=lambda name: lookups[name][0])
+        indexed = ('price', 'brand') if driver == 'brand' else (driver,)
+        return self.filter_rows(lookups[driver][1](), budget, brand_pref, min_scores, min_specs, indexed)
+
+    def count_matching(self, budget, brand_pref=None, min_scores=None, min_specs=None):
+        """Number of phones passing the filters"""
+        if not _positive_minimums(min_scores) and not _positive_minimums(min_specs):
+            return self.count_in_budget(budget, brand_pref)
+        return len(self.candidate_rows(budget, brand_pref, min_scores, min_specs))
+
+    def budget_staircase(self, primary_use, brand_pref=None):
+        """The BudgetStaircase for a profile, optionally restricted to one brand"""
+        profile = get_profile_registry().get(primary_use)
+        brand = brand_pref if brand_pref and brand_pref != "Any" else None
+        key = (profile.name, brand)
+        cached = self._staircases.get(key)
+        if cached is None or cached[0] != profile.fingerprint:
+            rows, prices = self.price_ordered_rows(brand)
+            scores, ties = self.profile_ranking(profile.name)
+            cached = (profile.fingerprint, BudgetStaircase(rows, prices, scores, STAIRCASE_DEPTH, ties))
+            self._staircases[key] = cached
+        return cached[1]
+
+    def price_ordered_rows(self, brand_pref=None):
+        """Row ids (of one brand, or all) in ascending price order, with their prices"""
+        order, prices = self.price_index
+        if brand_pref and brand_pref != "Any":
+            return self.brand_index[0].get(brand_pref, (order[:0], prices[:0]))
+        return order, prices
+
+@st.cache_resource(show_spinner=False)
+def _shared_catalog_index(_df, catalog_version):
+    return CatalogIndex(_df, catalog_version)
+
+def get_catalog_index(df):
+    """Return the shared CatalogIndex for a catalog from load_phone_data().
+
+    Any other frame (for example a filtered slice) gets a private, uncached index.
+    """
+    version = df.attrs.get('catalog_version')
+    if version is not None:
+        index = _shared_catalog_index(df, version)
+        if index.df is df:
+            return index
+    return CatalogIndex(df)
+
+def top_k_rows(rows, scores, k=None, ties=None):
+    """Order candidate rows by descending score (ties by row), keeping only the best k.
+
+    With k set, argpartition selects the k winners in O(n) and only those are
+    sorted; k=None gives the fully sorted order. ties, a per-row rank from a
+    profile's tie-breakers, replaces the row id as the tie-break when given.
+    """
+    if k is not None and k < len(rows):
+        if k <= 0:
+            return rows[:0], scores[:0]
+        # Partition around the k-th best score, then settle ties on that
+        # score by row id so the cut is deterministic
+        kth_score = -np.partition(-scores, k - 1)[k - 1]
+        better = np.flatnonzero(scores > kth_score)
+        tied = np.flatnonzero(scores == kth_score)
+        tied_keys = rows[tied] if ties is None else ties[rows[tied]]
+        tied = tied[np.argsort(tied_keys, kind='stable')[:k - len(better)]]
+        best = np.concatenate([better, tied])
+        rows, scores = rows[best], scores[best]
+    order = np.lexsort((rows if ties is None else ties[rows], -scores))
+    return rows[order], scores[order]
+
+# Name search
+SEARCH_RESULT_LIMIT = 20
+SEARCH_MATCH_RATIO = 0.5     # share of query trigrams a fuzzy match must contain
+SEARCH_CANDIDATE_LIMIT = 4096
+DENSE_POSTING_SHARE = 1 / 16  # trigrams in more names than this also get a membership bitmap
+
+NAME_SEPARATORS = re.compile(r'[\W_]+')
+
+def normalize_name(name):
+    """Lowercase a name and collapse runs of punctuation and whitespace to single spaces"""
+    return NAME_SEPARATORS.sub(' ', str(name).lower()).strip()
+
+def normalize_names(names):
+    """normalize_name() over a whole column"""
+    return pd.Series(names, dtype=object).astype(str).str.lower().str.replace(NAME_SEPARATORS, ' ', regex=True).str.strip()
+
+def _stable_key_order(keys):
+    """Stable argsort of non-negative integer keys, one 16-bit radix pass per 16 bits of the largest key"""
+    order = np.arange(len(keys))
+    if keys.size == 0:
+        return order
+    for shift in range(0, max(int(keys.max()).bit_length(), 1), 16):
+        order = order[np.argsort(((keys[order] >> shift) & 0xFFFF).astype(np.uint16), kind='stable')]
+    return order
+
+class NameSearchIndex:
+    """Character-trigram inverted index and sorted prefix table over catalog names.
+
+    Names are normalized and padded with a space on both sides, and every
+    distinct trigram gets a posting list of the rows containing it (CSR
+    layout, row ids ascending). A query's trigrams are looked up rarest
+    first. Rows sharing all of them are exact matches. Rows sharing at least
+    SEARCH_MATCH_RATIO of them still match, so a typo (which breaks at most
+    three trigrams) does not hide the phone.
+    """
+
+    def __init__(self, names):
+        self.names = normalize_names(names)
+        padded = (' ' + self.names + ' ').to_numpy(dtype=str)
+        codes = padded.view(np.uint32).reshape(len(padded), -1)
+        present = np.flatnonzero(np.bincount(codes.ravel())) if codes.size else np.zeros(1, dtype=np.int64)
+        # Dense ids for the code points that occur, so a trigram packs into one small int;
+        # the extra id stands for characters a query has but no name does
+        self.alphabet_size = len(present) + 1
+        self.alphabet = np.full(present[-1] + 1, len(present), dtype=np.int64)
+        self.alphabet[present] = np.arange(len(present))
+
+        keys = self._pack(self.alphabet[codes])
+        keys[codes[:, 2:] == 0] = -1
+        rows = np.repeat(np.arange(len(padded), dtype=np.int32), keys.shape[1])
+        keys = keys.ravel()
+        valid = keys >= 0
+        keys, rows = keys[valid], rows[valid]
+        order = _stable_key_order(keys)
+        keys, rows = keys[order], rows[order]
+        # A trigram repeated within one name is posted once
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys, self.postings = keys[first], rows[first]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+        self.trigrams = keys[starts]
+        self.offsets = np.r_[starts, len(keys)]
+        self.lengths = self.names.str.len().to_numpy()
+        # Membership tests against very common trigrams become a bit lookup instead of a bisect
+        self.bitmaps = {}
+        for i in np.flatnonzero(np.diff(self.offsets) > len(padded) * DENSE_POSTING_SHARE):
+            members = np.zeros(len(padded), dtype=bool)
+            members[self.postings[self.offsets[i]:self.offsets[i + 1]]] = True
+            self.bitmaps[i] = np.packbits(members, bitorder='little')
+
+    def _pack(self, ids):
+        return (ids[..., :-2] * self.alphabet_size + ids[..., 1:-1]) * self.alphabet_size + ids[..., 2:]
+
+    @cached_property
+    def prefix_table(self):
+        """Normalized names in sorted order with their row ids, for prefix bisection"""
+        names = self.names.to_numpy(dtype=str)
+        order = np.argsort(names, kind='stable').astype(np.int32)
+        return names[order], order
+
+    def query_postings(self, query):
+        """(posting list, bitmap or None) for the distinct trigrams of a normalized query, shortest first"""
+        # Only the front is padded: the last word may still be half typed
+        codes = np.array([ord(char) for char in ' ' + query], dtype=np.int64)
+        known = codes < len(self.alphabet)
+        ids = np.where(known, self.alphabet[np.where(known, codes, 0)], self.alphabet_size - 1)
+        keys = np.unique(self._pack(ids))
+        postings = []
+        for key, i in zip(keys, np.searchsorted(self.trigrams, keys)):
+            if i < len(self.trigrams) and self.trigrams[i] == key:
+                postings.append((self.postings[self.offsets[i]:self.offsets[i + 1]], self.bitmaps.get(i)))
+            else:
+                postings.append((self.postings[0:0], None))
+        return sorted(postings, key=lambda posting: len(posting[0]))
+
+    @staticmethod
+    def _contains(posting, rows):
+        """Mask of the (int32) rows present in a posting from query_postings()"""
+        rows_list, bitmap = posting
+        if bitmap is not None:
+            return (bitmap[rows >> 3] >> (rows & 7).astype(np.uint8) & 1).astype(bool)
+        if not len(rows_list):
+            return np.zeros(len(rows), dtype=bool)
+        at = np.minimum(np.searchsorted(rows_list, rows), len(rows_list) - 1)
+        return rows_list[at] == rows
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Ranked (row ids, match ratios) for a free-text name query.
+
+        Candidates come from the rarest trigrams only: a row sharing at
+        least m of the t query trigrams must contain one of the t - m + 1
+        rarest, so the common ones are only used to count matches on that
+        small set. Ties rank shorter names first, then by row id.
+        """
+        query = normalize_name(query)
+        if not query:
+            return self.postings[:0], np.ones(0)
+        postings = self.query_postings(query)
+        if not postings:
+            rows = self.complete(query, limit)
+            return rows, np.ones(len(rows))
+
+        total = len(postings)
+        required = total if total <= 2 else max(2, math.ceil(total * SEARCH_MATCH_RATIO))
+        seeds = [rows for rows, _ in postings[:total - required + 1]]
+        if sum(len(seed) for seed in seeds) > SEARCH_CANDIDATE_LIMIT:
+            # Too common to rank every fuzzy match: take the exact ones, then top up with
+            # the fuzzy matches among the lowest row ids that fit the candidate budget
+            exact = self._exact_matches(postings, limit)
+            if len(exact) == limit:
+                return exact, np.ones(len(exact))
+            low, high = 0, len(self.names)
+            while high - low > 1:
+                # Narrow the row bound on a 64-point grid, one bisect per seed list per pass
+                bounds = np.unique(np.linspace(low, high, 65).astype(np.int32))
+                counts = sum(np.searchsorted(seed, bounds) for seed in seeds)
+                fits = int(np.searchsorted(counts, SEARCH_CANDIDATE_LIMIT, side='right')) - 1
+                low, high = int(bounds[fits]), int(bounds[min(fits + 1, len(bounds) - 1)])
+            seeds = [exact] + [seed[:np.searchsorted(seed, np.int32(low))] for seed in seeds]
+
+        candidates = np.unique(np.concatenate(seeds))
+        matches = np.zeros(len(candidates), dtype=np.int32)
+        for posting in postings:
+            matches += self._contains(posting, candidates)
+        keep = matches >= required
+        candidates, matches = candidates[keep], matches[keep]
+        order = np.lexsort((candidates, self.lengths[candidates], -matches))[:limit]
+        return candidates[order], matches[order] / total
+
+    def _exact_matches(self, postings, limit, chunk_size=1024):
+        """First rows (by row id) containing every query trigram, intersecting the rarest list in growing chunks"""
+        found = []
+        rarest, others = postings[0][0], postings[1:]
+        start = 0
+        while start < len(rarest):
+            rows = rarest[start:start + chunk_size]
+            start, chunk_size = start + chunk_size, chunk_size * 2
+            for posting in others:
+                rows = rows[self._contains(posting, rows)]
+            found.append(rows)
+            if sum(len(rows) for rows in found) >= limit:
+                break
+        return np.concatenate(found)[:limit] if found else rarest[:0]
+
+    def complete(self, prefix, limit=SEARCH_RESULT_LIMIT):
+        """Row ids of the names starting with prefix, in name order"""
+        names, order = self.prefix_table
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return order[:0]
+        start = np.searchsorted(names, prefix, side='left')
+        stop = np.searchsorted(names, prefix + '\U0010ffff', side='left')
+        return order[start:min(stop, start + limit)]
+
+# Name resolution
+FUZZY_RESOLVE_RATIO = 0.5
+# Trailing model qualifiers and their common shorthand ("S24 Ultra" -> "S24U", "15 Pro Max" -> "15 PM")
+QUALIFIER_SHORTHANDS = {
+    'pm': ['promax'],
+    'promax': ['promax'],
+    'u': ['ultra'],
+    'p': ['pro', 'plus'],
+    'm': ['mini'],
+}
+QUALIFIER_WORDS = {full for fulls in QUALIFIER_SHORTHANDS.values() for full in fulls} | {'max'}
+
+def name_key(name):
+    """Lookup key for a device name: lowercase letters and digits only"""
+    return NAME_SEPARATORS.sub('', str(name).lower())
+
+class NameResolver:
+    """O(1) resolution of typed device names, aliases and shorthand to catalog rows.
+
+    Canonical names and the entries of an optional 'aliases' column are
+    hashed by name_key(). Shorthand such as 'S24U' or '15 PM' is resolved by
+    expanding trailing qualifiers ('u' -> 'ultra') and bisecting a sorted
+    table of reversed keys, so any tail of a name ('s24ultra',
+    'galaxys24ultra') works as long as exactly one phone ends with it.
+    Anything else goes to fuzzy_search: a callable returning ranked (rows,
+    match ratios) for a text, such as NameSearchIndex.search.
+    """
+
+    def __init__(self, df, fuzzy_search=None):
+        self.fuzzy_search = fuzzy_search
+        keys = df['name'].astype(str).str.lower().str.replace(NAME_SEPARATORS, '', regex=True)
+        self.canonical = keys.to_numpy(dtype=object)
+        self.keys = {}
+        if 'aliases' in df.columns:
+            for row, aliases in enumerate(df['aliases']):
+                for alias in aliases:
+                    self.keys.setdefault(name_key(alias), row)
+        # Canonical names win over aliases; the first of several identical names wins
+        self.keys.update(zip(keys.iloc[::-1], range(len(keys) - 1, -1, -1)))
+        reversed_keys = keys.str[::-1].to_numpy(dtype=str)
+        order = np.argsort(reversed_keys, kind='stable')
+        self.suffixes, self.suffix_rows = reversed_keys[order], order.astype(np.int32)
+
+    def _suffix_range(self, key):
+        """[start, stop) of the suffix table entries whose name key ends with key"""
+        reversed_key = key[::-1]
+        return (int(np.searchsorted(self.suffixes, reversed_key, side='left')),
+                int(np.searchsorted(self.suffixes, reversed_key + '\U0010ffff', side='left')))
+
+    def resolve(self, text):
+        """(row id, how) for a typed name, with how in 'exact', 'alias' or 'fuzzy'; (None, None) when unknown or ambiguous"""
+        key = name_key(text)
+        if not key:
+            return None, None
+        row = self.keys.get(key)
+        if row is not None:
+            return row, 'exact' if self.canonical[row] == key else 'alias'
+
+        if len(key) >= 3 and not key.isdigit() and key not in QUALIFIER_WORDS:
+            candidates = [key] + [key[:-len(short)] + full
+                                  for short, fulls in QUALIFIER_SHORTHANDS.items()
+                                  if key.endswith(short) and len(key) > len(short) for full in fulls]
+            ranges = [self._suffix_range(candidate) for candidate in candidates]
+            # The table is sorted by reversed name, so copies of one name sit together and a range
+            # holds a single phone (however often it is listed) exactly when its ends agree
+            names = {self.suffixes[end] for start, stop in ranges if stop > start for end in (start, stop - 1)}
+            if len(names) == 1:
+                return int(min(self.suffix_rows[start:stop].min() for start, stop in ranges if stop > start)), 'alias'
+
+        if self.fuzzy_search is not None:
+            rows, ratios = self.fuzzy_search(text)
+            if len(rows) and ratios[0] >= FUZZY_RESOLVE_RATIO and (len(rows) == 1 or ratios[1] < ratios[0]):
+                return int(rows[0]), 'fuzzy'
+        return None, None
+
+# Feature search
+FEATURE_FIELD_WEIGHTS = {'features': 1.0, 'pros': 0.7, 'cons': 0.3}  # cons often describe what a phone lacks
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+STOP_WORDS = frozenset(['a', 'an', 'and', 'or', 'the', 'with', 'of', 'in', 'on', 'to', 'for', 'that', 'has', 'have'])
+
+def tokenize(text):
+    """Lowercase word tokens of a feature text, with simple plurals folded ('cameras' -> 'camera')"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        if token not in STOP_WORDS:
+            tokens.append(token)
+    return tokens
+
+class FeatureSearchIndex:
+    """BM25F inverted index over the features, pros and cons lists of a catalog.
+
+    Every (term, row, field) posting stores its term frequency. Postings are
+    grouped by term and sorted by row, and held in flat int32/uint8/uint16
+    arrays. Field weights are applied at query time. Each distinct list
+    entry is tokenized only once, however many phones share it.
+    """
+
+    def __init__(self, df, fields=tuple(FEATURE_FIELD_WEIGHTS)):
+        self.fields = list(fields)
+        n = len(df)
+        entries, entry_rows, entry_fields = [], [], []
+        for field_id, field in enumerate(self.fields):
+            values = df[field]
+            lengths = values.map(len).to_numpy()
+            entries.extend(entry for value in values for entry in value)
+            entry_rows.append(np.repeat(np.arange(n, dtype=np.int32), lengths))
+            entry_fields.append(np.full(int(lengths.sum()), field_id, dtype=np.uint8))
+        entry_rows = np.concatenate(entry_rows) if entry_rows else np.zeros(0, dtype=np.int32)
+        entry_fields = np.concatenate(entry_fields) if entry_fields else np.zeros(0, dtype=np.uint8)
+        # Row-major entry order, so the postings of every term come out sorted by row
+        order = _stable_key_order(entry_rows)
+        entry_rows, entry_fields = entry_rows[order], entry_fields[order]
+        codes, uniques = pd.factorize(pd.Series(entries, dtype=object).iloc[order])
+
+        self.vocabulary = {}
+        unique_terms = [[self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokenize(entry)]
+                        for entry in uniques]
+        unique_lengths = np.array([len(terms) for terms in unique_terms], dtype=np.int64)
+        unique_starts = np.r_[0, np.cumsum(unique_lengths)[:-1]] if len(unique_terms) else np.zeros(0, dtype=np.int64)
+        unique_flat = np.fromiter((term for terms in unique_terms for term in terms), dtype=np.int32,
+                                  count=int(unique_lengths.sum()))
+
+        # Expand every entry occurrence into its term ids (a CSR gather)
+        lengths = unique_lengths[codes] if len(codes) else np.zeros(0, dtype=np.int64)
+        offsets = np.repeat(unique_starts[codes] - (np.cumsum(lengths) - lengths), lengths)
+        terms = unique_flat[np.arange(int(lengths.sum())) + offsets]
+        rows = np.repeat(entry_rows, lengths)
+        fields_of = np.repeat(entry_fields, lengths)
+
+        self.field_lengths = np.zeros((len(self.fields), n), dtype=np.uint16)
+        np.add.at(self.field_lengths, (fields_of, rows), 1)
+
+        order = _stable_key_order(terms)
+        terms, rows, fields_of = terms[order], rows[order], fields_of[order]
+        starts = np.flatnonzero(np.r_[True, (terms[1:] != terms[:-1]) | (rows[1:] != rows[:-1])
+                                      | (fields_of[1:] != fields_of[:-1])]) if len(terms) else np.zeros(0, dtype=np.int64)
+        self.tf = np.diff(np.r_[starts, len(terms)]).astype(np.uint16)
+        self.rows, self.posting_fields = rows[starts], fields_of[starts]
+        posting_terms = terms[starts]
+        self.offsets = np.searchsorted(posting_terms, np.arange(len(self.vocabulary) + 1))
+        # Document frequency counts rows, not (row, field) pairs
+        new_row = np.r_[True, (posting_terms[1:] != posting_terms[:-1]) | (self.rows[1:] != self.rows[:-1])] \
+            if len(posting_terms) else np.zeros(0, dtype=bool)
+        self.doc_freq = np.bincount(posting_terms[new_row], minlength=len(self.vocabulary))
+        self.size = n
+        self._lengths = {}
+
+    def _weighted_lengths(self, field_weights):
+        """Per-row document lengths under a field weighting, and their mean (memoized per weighting)"""
+        if field_weights not in self._lengths:
+            lengths = np.asarray(field_weights, dtype=np.float32) @ self.field_lengths
+            self._lengths[field_weights] = (lengths, max(float(lengths.mean()), 1e-9) if self.size else 1.0)
+        return self._lengths[field_weights]
+
+    def search(self, query, weights=None):
+        """BM25F (row ids ascending, scores) for a free-text query; only rows containing a query term match"""
+        weights = FEATURE_FIELD_WEIGHTS if weights is None else weights
+        field_weights = np.array([weights.get(field, 0.0) for field in self.fields], dtype=np.float32)
+        lengths, average = self._weighted_lengths(tuple(field_weights))
+
+        found_rows, found_scores = [], []
+        for token in dict.fromkeys(tokenize(query)):
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            start, stop = self.offsets[term], self.offsets[term + 1]
+            term_rows = self.rows[start:stop]
+            weighted_tf = field_weights[self.posting_fields[start:stop]] * self.tf[start:stop]
+            # Fold the per-field postings of each row into one weighted term frequency
+            firsts = np.flatnonzero(np.r_[True, term_rows[1:] != term_rows[:-1]])
+            term_rows, weighted_tf = term_rows[firsts], np.add.reduceat(weighted_tf, firsts)
+            idf = math.log(1 + (self.size - self.doc_freq[term] + 0.5) / (self.doc_freq[term] + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[term_rows] / average)
+            found_rows.append(term_rows)
+            found_scores.append(idf * weighted_tf * (BM25_K1 + 1) / (weighted_tf + norm))
+
+        if not found_rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if sum(len(term_rows) for term_rows in found_rows) > self.size // 16:
+            # Broad queries: accumulate into a dense score vector (rows are unique within a term)
+            dense = np.zeros(self.size, dtype=np.float32)
+            for term_rows, term_scores in zip(found_rows, found_scores):
+                dense[term_rows] += term_scores
+            matched = np.flatnonzero(dense > 0).astype(np.int32)
+            return matched, dense[matched]
+        matched, inverse = np.unique(np.concatenate(found_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(found_scores)).astype(np.float32)
+        return matched.astype(np.int32), scores
+
+USE_PHRASES = {
+    'gaming': "Gaming", 'games': "Gaming", 'photography': "Photography", 'photos': "Photography",
+    'pictures': "Photography", 'battery life': "Battery Life", 'battery': "Battery Life",
+    'general use': "General Use", 'everyday use': "General Use", 'everyday': "General Use",
+}
+BUDGET_PATTERN = re.compile(r'\b(?:under|below|less than|up to|at most|max(?:imum)?|within)\s*\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?'
+                            r'|\$\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?\s*(?:or less|max(?:imum)?|and under)', re.IGNORECASE)
+USE_PATTERN = re.compile(r'\bfor\s+(' + '|'.join(sorted(map(re.escape, USE_PHRASES), key=len, reverse=True)) + r')\b',
+                         re.IGNORECASE)
+
+def parse_feature_query(text):
+    """Split a query like 'fast charging under $700 for gaming' into filters and the remaining text.
+
+    Returns {'text', 'budget', 'primary_use'}; budget and primary_use are None
+    when the query does not state them.
+    """
+    budget = primary_use = None
+    match = BUDGET_PATTERN.search(text)
+    if match:
+        amount, thousands = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        budget = float(amount.replace(',', '')) * (1000 if thousands else 1)
+        text = text[:match.start()] + ' ' + text[match.end():]
+    match = USE_PATTERN.search(text)
+    if match:
+        primary_use = USE_PHRASES[match.group(1).lower()]
+        text = text[:match.start()] + ' ' + text[match.end():]
+    return {'text': ' '.join(text.split()), 'budget': budget, 'primary_use': primary_use}
+
+def search_phones(df, query, budget=float('inf'), primary_use=DEFAULT_PROFILE, brand_pref=None,
+                  min_camera=0, min_battery=0, top_k=SEARCH_RESULT_LIMIT, weights=None):
+    """Answer a natural-language feature query within the recommendation filters.
+
+    A budget or primary use stated in the query ('under $700', 'for gaming')
+    overrides the corresponding argument. The rest of the text is matched
+    with get_recommendations(text=...).
+    """
+    parsed = parse_feature_query(query)
+    if parsed['budget'] is not None:
+        budget = parsed['budget']
+    if parsed['primary_use'] is not None:
+        primary_use, weights = parsed['primary_use'], None
+    return get_recommendations(df, budget, primary_use, brand_pref, min_camera, min_battery,
+                               top_k=top_k, weights=weights, text=parsed['text'] or None)
+
+# Value frontier
+DOMINANCE_BLOCK_CELLS = 1 << 22   # point x rival x axis comparisons per vectorized step
+FRONTIER_BLOCK_SIZE = 4096
+
+def frontier_costs(columns):
+    """Per-phone cost vectors, lower is better on every axis: price, then each score negated.
+
+    float64 keeps fractional prices as they are and holds the integer scores exactly.
+    """
+    return np.column_stack([columns['price'].astype(np.float64)] +
+                           [-columns[column].astype(np.float64) for column in SCORE_COLUMNS])
+
+def dominated_mask(costs, rivals):
+    """Mask of the costs rows dominated by some rivals row (no worse on any axis, better on one)"""
+    dominated = np.zeros(len(costs), dtype=bool)
+    start = 0
+    while start < len(rivals):
+        alive = np.flatnonzero(~dominated)
+        if len(alive) == 0:
+            break
+        # Rows already found dominated drop out, so later steps compare ever fewer points
+        stop = start + max(1, DOMINANCE_BLOCK_CELLS // (len(alive) * costs.shape[1]))
+        points, block = costs[alive][:, None, :], rivals[start:stop][None, :, :]
+        hit = ((block <= points).all(axis=2) & (block < points).any(axis=2)).any(axis=1)
+        dominated[alive[hit]] = True
+        start = stop
+    return dominated
+
+def value_frontier(costs, rows=None):
+    """Ascending row ids of the Pareto frontier (skyline) of costs, optionally among rows only.
+
+    Rows are visited in price order, in blocks that never split a price.
+    Scores are small integers, so the frontier found so far is kept as a
+    dense camera x battery x performance grid holding the best display
+    score at or above each cell. A row is dominated by a cheaper frontier
+    phone exactly when its cell holds a display score at least its own, so
+    that check is a lookup. Only the rows passing it are compared pairwise,
+    within their block. The grid is re-swept only after blocks that add
+    frontier phones, which keeps the work close to linear in the rows.
+    """
+    rows = np.arange(len(costs)) if rows is None else np.asarray(rows)
+    order = rows[np.argsort(costs[rows, 0], kind='stable')]
+    prices, scores = costs[order, 0], (-costs[order, 1:]).astype(np.int64)
+    low = int(scores[:, :3].min(initial=0))
+    size = int(scores[:, :3].max(initial=0)) - low + 1
+    empty = np.iinfo(np.int16).min
+    best = np.full((size, size, size), empty, dtype=np.int16)
+    reach = best
+    frontier = [np.empty(0, dtype=np.int64)]
+    start = 0
+    while start < len(order):
+        stop = min(start + FRONTIER_BLOCK_SIZE, len(order))
+        stop = int(np.searchsorted(prices, prices[stop - 1], side='right'))
+        block = np.arange(start, stop)
+        cells = tuple((scores[block, :3] - low).T)
+        block = block[reach[cells] < scores[block, 3]]
+        block = block[~dominated_mask(costs[order[block]], costs[order[block]])]
+        if len(block):
+            frontier.append(order[block])
+            np.maximum.at(best, tuple((scores[block, :3] - low).T), scores[block, 3].astype(np.int16))
+            # reach[c, b, p] = max of best over every cell >= (c, b, p)
+            reach = best[::-1, ::-1, ::-1]
+            for axis in range(3):
+                reach = np.maximum.accumulate(reach, axis=axis)
+            reach = reach[::-1, ::-1, ::-1]
+        start = stop
+    return np.sort(np.concatenate(frontier))
+
+def patched_frontier(frontier, old_costs, new_costs, replaced):
+    """The frontier after patch_catalog() dropped the replaced rows and appended new ones.
+
+    A phone off the old frontier stays off unless only replaced frontier
+    phones dominated it, so just the kept frontier, the phones those
+    replaced ones dominated and the new rows are re-checked.
+    """
+    kept = ~replaced
+    new_position = np.cumsum(kept) - 1
+    candidates = [new_position[frontier[kept[frontier]]], np.arange(int(kept.sum()), len(new_costs))]
+    lost = frontier[replaced[frontier]]
+    if len(lost):
+        freed = np.flatnonzero(kept)[dominated_mask(old_costs[kept], old_costs[lost])]
+        candidates.append(new_position[freed])
+    return value_frontier(new_costs, np.unique(np.concatenate(candidates)))
+
+def frontier_trace(df, rows, limit=None):
+    """Star markers highlighting value-frontier phones on the price/performance chart.
+
+    Like the main scatter, the overlay holds at most limit (by default
+    SCATTER_POINT_LIMIT) markers: a larger frontier is thinned to evenly
+    spaced phones in price order, which keeps its shape and both ends.
+    """
+    limit = SCATTER_POINT_LIMIT if limit is None else limit
+    name = '💎 Value frontier'
+    if len(rows) > limit:
+        rows = np.asarray(rows)
+        rows = rows[np.argsort(df['price'].to_numpy()[rows], kind='stable')]
+        name += f" ({limit:,} of {len(rows):,} shown)"
+        rows = rows[np.linspace(0, len(rows) - 1, limit).round().astype(np.int64)]
+    phones = df.iloc[rows]
+    return go.Scattergl(
+        x=phones['price'].to_numpy(),
+        y=phones['performance'].to_numpy(),
+        mode='markers',
+        name=name,
+        showlegend=True,
+        marker=dict(symbol='star', size=13, color='#ffd700', line=dict(color='white', width=1)),
+        customdata=phones['name'].astype(str).to_numpy(),
+        hovertemplate="<b>%{customdata}</b><br>$%{x:,} · Performance %{y}"
+                      "<br>No cheaper phone beats it on every score<extra></extra>"
+    )
+
+# Cheaper alternatives
+KD_LEAF_SIZE = 64
+ALTERNATIVE_LIMIT = 3
+
+class DominanceTree:
+    """Implicit k-d tree over frontier_costs() rows for "cheaper and at least as good" queries.
+
+    Rows are permuted so that every node covers a contiguous slice, split at
+    the median of its widest axis (relative to that axis' overall range).
+    Node i has children 2i+1 and 2i+2, and the leaves hold about
+    KD_LEAF_SIZE rows each. Every node keeps the bounding box of its rows,
+    and the best score under it per profile. A query walks the tree
+    best-first by that score bound. It skips every subtree whose box holds
+    no cheaper phone meeting the minimums, or whose bound cannot beat the
+    k-th alternative found so far, so only a few root-to-leaf paths are
+    usually visited.
+    """
+
+    def __init__(self, costs):
+        self.costs = costs
+        size = len(costs)
+        self.depth = max(0, math.ceil(math.log2(max(size / KD_LEAF_SIZE, 1))))
+        self.first_leaf = (1 << self.depth) - 1
+        self.order = np.arange(size)
+        scale = np.maximum(costs.max(axis=0, initial=0) - costs.min(axis=0, initial=0), 1) if size else 1
+        for level in range(self.depth):
+            width = 1 << level
+            for i in range(width):
+                start, stop = i * size // width, (i + 1) * size // width
+                if stop - start < 2:
+                    continue
+                rows = self.order[start:stop]
+                values = costs[rows]
+                axis = int(np.argmax((values.max(axis=0) - values.min(axis=0)) / scale))
+                middle = (2 * i + 1) * size // (2 * width) - start
+                self.order[start:stop] = rows[np.argpartition(values[:, axis], middle)]
+        leaves = 1 << self.depth
+        self.leaf_starts = np.arange(leaves + 1) * size // leaves
+        self.lo = self._combine(np.minimum, costs[self.order], np.inf)
+        self.hi = self._combine(np.maximum, costs[self.order], -np.inf)
+        # Lowest row id under each node, to settle equal score bounds the way top_k_rows() settles ties
+        self.min_row = self._combine(np.minimum, self.order, np.iinfo(self.order.dtype).max)
+        self._score_bounds = {}
+
+    def _combine(self, ufunc, values, empty):
+        """Per-node ufunc-reduction of values (given in tree order), heap-laid-out from the root"""
+        leaves = 1 << self.depth
+        starts = self.leaf_starts[:-1]
+        filled = self.leaf_starts[1:] > starts
+        shape = (leaves,) + values.shape[1:]
+        level = np.full(shape, empty, dtype=values.dtype)
+        if filled.any():
+            level[filled] = ufunc.reduceat(values, starts[filled], axis=0)
+        levels = [level]
+        while len(level) > 1:
+            level = ufunc(level[0::2], level[1::2])
+            levels.append(level)
+        return np.concatenate(levels[::-1])
+
+    def score_bounds(self, key, scores):
+        """Best score under every node, cached per key = (profile name, version).
+
+        scores is a callable returning every row's score, called only on a
+        cache miss; a new version replaces the profile's previous bounds.
+        """
+        cached = self._score_bounds.get(key[0])
+        if cached is None or cached[0] != key:
+            cached = (key, self._combine(np.maximum, scores()[self.order].astype(np.float64), -np.inf))
+            self._score_bounds[key[0]] = cached
+        return cached[1]
+
+    def best_dominating(self, limits, axes, bounds, score_rows, k):
+        """The k best-scoring rows with costs[:, axes] <= limits, as (rows, scores) best first.
+
+        bounds is the per-node score bound from score_bounds() and
+        score_rows maps a row array to the same scores.
+        """
+        if len(self.costs) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        found = []  # min-heap of (score, -row) holding the best k so far
+        frontier = [(-bounds[0], self.min_row[0], 0)]
+        while frontier:
+            negative_bound, min_row, node = heapq.heappop(frontier)
+            if len(found) == k and (-negative_bound, -min_row) < found[0]:
+                break
+            if node >= self.first_leaf:
+                leaf = node - self.first_leaf
+                rows = self.order[self.leaf_starts[leaf]:self.leaf_starts[leaf + 1]]
+                rows = rows[(self.costs[rows][:, axes] <= limits).all(axis=1)]
+                for score, row in zip(score_rows(rows).tolist(), rows.tolist()):
+                    entry = (score, -row)
+                    if len(found) < k:
+                        heapq.heappush(found, entry)
+                    elif entry > found[0]:
+                        heapq.heapreplace(found, entry)
+                continue
+            for child in (2 * node + 1, 2 * node + 2):
+                best_case = (bounds[child], -self.min_row[child])
+                if (self.lo[child, axes] <= limits).all() and (len(found) < k or best_case > found[0]):
+                    heapq.heappush(frontier, (-bounds[child], self.min_row[child], child))
+        found.sort(reverse=True)
+        return (np.array([-row for _, row in found], dtype=np.int64),
+                np.array([score for score, _ in found], dtype=np.float32))
+
+def cheaper_alternatives(df, row, primary_use=DEFAULT_PROFILE, weights=None, k=ALTERNATIVE_LIMIT):
+    """Up to k phones cheaper than catalog row `row` and at least as good on the profile's key scores.
+
+    The key scores are the columns the profile (or the custom weights)
+    gives a positive weight to. Alternatives are ranked by the profile
+    score, or by the custom blend. They are answered from the catalog's
+    DominanceTree without scanning df.
+    """
+    index = get_catalog_index(df)
+    tree = index.dominance_tree
+    if weights is not None:
+        vector = normalize_weights(weights)
+        score_rows = lambda rows: index.weighted_scores(rows, vector)
+        bounds = tree.score_bounds(_profile_key(primary_use, weights), lambda: score_rows(np.arange(len(df))))
+    else:
+        profile = get_profile_registry().get(primary_use)
+        vector = profile.weights
+        scores, _ = index.profile_ranking(profile.name)
+        score_rows = lambda rows: scores[rows]
+        bounds = tree.score_bounds(_profile_key(profile.name), lambda: scores)
+    key_columns = [i for i, weight in enumerate(vector) if weight > 0] or list(range(len(SCORE_COLUMNS)))
+    axes = np.array([0] + [i + 1 for i in key_columns])
+    costs = index.frontier_costs[row]
+    # Strictly cheaper: the largest price below this one still passes the <= test
+    limits = np.concatenate([[np.nextafter(costs[0], -np.inf)], costs[axes[1:]]])
+    rows, scores = tree.best_dominating(limits, axes, bounds, score_rows, k)
+    return _recommendation_frame(df, rows, scores, len(rows))
+
+# Market aggregates
+MARKET_GROUPS = ['brand', 'category']
+MARKET_STAT_COLUMNS = ['price'] + SCORE_COLUMNS
+SCATTER_LIMIT_ENV_VAR = "PHONEHUB_SCATTER_POINT_LIMIT"
+SCATTER_POINT_LIMIT = int(os.environ.get(SCATTER_LIMIT_ENV_VAR, 5_000))
+SCATTER_BINS = (80, 50)  # price x performance cells in the large-catalog density chart
+
+def _group_moments(frame, by):
+    """Per-group row count plus the sum and sum of squares of every stat column"""
+    values = frame[MARKET_STAT_COLUMNS].astype(np.float64)
+    grouped = pd.concat([values, values.pow(2).add_suffix('_sq')], axis=1).groupby(
+        frame[by].astype(str), observed=True)
+    moments = grouped.sum()
+    moments.insert(0, 'count', grouped.size().astype(np.float64))
+    return moments
+
+class MarketAggregates:
+    """Brand and category summaries of a catalog, kept as mergeable moments.
+
+    Each group stores its row count and the sums and sums of squares of the
+    price and score columns. Adding or removing rows only touches those
+    rows' groups, and the means and spreads are derived from the moments
+    on demand.
+    """
+
+    def __init__(self, moments):
+        self.moments = moments
+
+    @classmethod
+    def from_frame(cls, frame):
+        return cls({by: _group_moments(frame, by) for by in MARKET_GROUPS})
+
+    def add(self, frame):
+        return self._merge(frame, 1)
+
+    def remove(self, frame):
+        return self._merge(frame, -1)
+
+    def _merge(self, frame, sign):
+        """New aggregates with frame's rows added (sign=1) or removed (sign=-1)"""
+        merged = {}
+        for by, moments in self.moments.items():
+            moments = moments.add(sign * _group_moments(frame, by), fill_value=0)
+            merged[by] = moments[moments['count'] > 0]
+        return MarketAggregates(merged)
+
+    def counts(self, by='brand'):
+        """Rows per group, largest first"""
+        return self.moments[by]['count'].astype(np.int64).sort_values(ascending=False, kind='stable')
+
+    def summary(self, by='category'):
+        """Count plus the mean and standard deviation of every stat column per group"""
+        moments = self.moments[by]
+        count = moments['count']
+        summary = pd.DataFrame({'count': count.astype(np.int64)})
+        for column in MARKET_STAT_COLUMNS:
+            mean = moments[column] / count
+            summary[f'{column}_mean'] = mean
+            summary[f'{column}_std'] = np.sqrt((moments[f'{column}_sq'] / count - mean ** 2).clip(lower=0))
+        return summary
+
+def _style_market_figure(fig):
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        title_font=dict(color='#00f5ff', size=16)
+    )
+    return fig
+
+def price_performance_density(prices, performance, price_range, performance_range):
+    """Heatmap of phone counts over a fixed price x performance grid, binned server-side"""
+    counts, price_edges, performance_edges = np.histogram2d(
+        prices, performance, bins=SCATTER_BINS, range=[price_range, performance_range])
+    counts[counts == 0] = np.nan
+    fig = go.Figure(go.Heatmap(
+        z=counts.T,
+        x=(price_edges[:-1] + price_edges[1:]) / 2,
+        y=(performance_edges[:-1] + performance_edges[1:]) / 2,
+        colorscale='Viridis',
+        colorbar=dict(title='Phones'),
+        hovertemplate="Price ≈ $%{x:,.0f}<br>Performance ≈ %{y:.0f}<br>%{z:,} phones<extra></extra>"
+    ))
+    fig.update_layout(title="Price vs Performance Density", xaxis_title='price', yaxis_title='performance')
+    return _style_market_figure(fig)
+
+def price_performance_points(df, rows):
+    """WebGL scatter of the given rows, with per-phone hover detail"""
+    phones = df.iloc[rows]
+    palette = px.colors.qualitative.Plotly
+    codes = pd.Categorical(phones['brand']).codes
+    fig = go.Figure(go.Scattergl(
+        x=phones['price'].to_numpy(),
+        y=phones['performance'].to_numpy(),
+        mode='markers',
+        marker=dict(size=4 + phones['camera'].to_numpy() / 10, color=[palette[code % len(palette)] for code in codes],
+                    opacity=0.8),
+        customdata=np.column_stack([phones['name'].astype(str), phones['brand'].astype(str),
+                                    phones['battery'].to_numpy(), phones['display'].to_numpy()]),
+        hovertemplate="<b>%{customdata[0]}</b> (%{customdata[1]})<br>$%{x:,}<br>Performance %{y}"
+                      "<br>Battery %{customdata[2]} · Display %{customdata[3]}<extra></extra>"
+    ))
+    fig.update_layout(title="Price vs Performance Analysis", xaxis_title='price', yaxis_title='performance')
+    return _style_market_figure(fig)
+
+def price_performance_view(df, price_range, performance_range):
+    """The price/performance chart for a zoomed window of a large catalog, plus the phone count in view.
+
+    Windows holding at most SCATTER_POINT_LIMIT phones are drawn point by
+    point with hover detail; larger ones are re-binned over the window.
+    Value-frontier phones in the window are overlaid either way.
+    """
+    index = get_catalog_index(df)
+    order, prices = index.price_index
+    start = np.searchsorted(prices, prices.dtype.type(price_range[0]), side='left')
+    stop = np.searchsorted(prices, prices.dtype.type(price_range[1]), side='right')
+    rows = order[start:stop]
+    performance = index.columns['performance'][rows]
+    rows = rows[(performance >= performance_range[0]) & (performance <= performance_range[1])]
+    if len(rows) <= SCATTER_POINT_LIMIT:
+        fig = price_performance_points(df, np.sort(rows))
+    else:
+        fig = price_performance_density(index.columns['price'][rows], index.columns['performance'][rows],
+                                        price_range, performance_range)
+    frontier = index.value_frontier
+    prices, performance = index.columns['price'][frontier], index.columns['performance'][frontier]
+    in_view = ((prices >= price_range[0]) & (prices <= price_range[1]) &
+               (performance >= performance_range[0]) & (performance <= performance_range[1]))
+    fig.add_trace(frontier_trace(df, frontier[in_view]))
+    return fig, len(rows)
+
+def build_market_figures(df, market):
+    """Price/performance scatter and brand share figures, plus the per-category summary table.
+
+    Catalogs above SCATTER_POINT_LIMIT rows get a binned density chart
+    instead of one marker per phone, which keeps the payload bounded. The
+    value frontier is highlighted on top.
+    """
+    if len(df) > SCATTER_POINT_LIMIT:
+        prices = get_catalog_index(df).price_index[1]
+        price_range = (float(prices[0]), float(prices[-1])) if len(prices) else (0.0, 1.0)
+        fig_scatter = price_performance_density(df['price'].to_numpy(), df['performance'].to_numpy(),
+                                                price_range, (0, 100))
+    else:
+        fig_scatter = _style_market_figure(px.scatter(
+            df, x='price', y='performance',
+            color='brand', size='camera',
+            hover_data=['name', 'battery', 'display'],
+            title="Price vs Performance Analysis"
+        ))
+    fig_scatter.add_trace(frontier_trace(df, get_catalog_index(df).value_frontier))
+    brand_counts = market.counts('brand')
+    fig_pie = _style_market_figure(px.pie(
+        values=brand_counts.values,
+        names=brand_counts.index,
+        title="Brand Distribution"
+    ))
+    summary = market.summary('category')
+    category_table = pd.DataFrame({
+        'Category': summary.index,
+        'Phones': summary['count'].to_numpy(),
+        'Avg Price': [f"${value:,.0f}" for value in summary['price_mean']],
+        'Price Spread': [f"±${value:,.0f}" for value in summary['price_std']],
+        'Avg Performance': [f"{value:.1f}/100" for value in summary['performance_mean']],
+        'Avg Camera': [f"{value:.1f}/100" for value in summary['camera_mean']],
+        'Avg Battery': [f"{value:.1f}/100" for value in summary['battery_mean']],
+    })
+    return {'scatter': fig_scatter, 'pie': fig_pie, 'categories': category_table}
+
+def patch_catalog(df, rows):
+    """Upsert raw catalog rows into a loaded catalog, matching on name.
+
+    Returns a new catalog frame with a derived catalog version. If the
+    market aggregates of df were already built, the new catalog's aggregates
+    are derived from them by removing the replaced rows and adding the new
+    ones. They are not recomputed over the whole catalog. The value frontier
+    is carried over the same way with patched_frontier().
+    """
+    version = df.attrs.get('catalog_version')
+    rows = ingest_catalog(_fill_optional_columns(pd.DataFrame(rows)))
+    replaced = df['name'].isin(rows['name']).to_numpy()
+    patched = ingest_catalog(pd.concat([df[~replaced], rows], ignore_index=True))
+    if version is None:
+        return patched
+
+    digest = hashlib.sha1(rows.to_json(orient='records').encode()).hexdigest()[:12]
+    patched.attrs['catalog_version'] = f"{version}+{digest}"
+    index = _shared_catalog_index(patched, patched.attrs['catalog_version'])
+    source = get_catalog_index(df)
+    if index.df is patched and 'market' in source.__dict__:
+        index.market = source.market.remove(df[replaced]).add(rows)
+    if index.df is patched and 'value_frontier' in source.__dict__:
+        index.value_frontier = patched_frontier(source.value_frontier, source.frontier_costs,
+                                                index.frontier_costs, replaced)
+    return index.df
+
+# Recommendation engine
+SCORE_DECIMALS = 4
+
+def get_recommendations(df, budget, primary_use, brand_pref=None, min_camera=0, min_battery=0,
+                        min_ram=0, min_storage=0, min_battery_mah=0, top_k=None, weights=None, text=None,
+                        value_frontier=False):
+    """Rank the phones matching the filters by their primary-use score.
+
+    Candidate rows come from the catalog's secondary indexes and scores from
+    its precomputed score matrix, so a request is an index lookup plus a
+    top-k selection. Pass top_k=None for the fully sorted result (e.g. for
+    exports). With weights (a {score column: weight} dict) the phones are
+    ranked by that custom blend instead of the primary-use profile. With
+    text, only phones whose features, pros or cons match it are kept, ranked
+    by BM25 relevance (in a 'relevance' column) and then by score. With
+    value_frontier, only phones on the catalog's value frontier (not beaten
+    on price and every score by another phone) are considered. The number
+    of phones that matched before the top-k cut is available as
+    result.attrs['match_count'].
+    """
+    index = get_catalog_index(df)
+    min_scores = {'camera': min_camera, 'battery': min_battery}
+    min_specs = {'ram': min_ram, 'storage': min_storage, 'battery_mah': min_battery_mah}
+    
+    if text is not None:
+        rows, relevance = index.feature_search.search(text)
+        mask = index.filter_mask(rows, budget, brand_pref, min_scores, min_specs)
+        if mask is not None:
+            rows, relevance = rows[mask], relevance[mask]
+        if value_frontier:
+            on_frontier = np.isin(rows, index.value_frontier)
+            rows, relevance = rows[on_frontier], relevance[on_frontier]
+        ties = None
+        if weights is not None:
+            scores = index.weighted_scores(rows, normalize_weights(weights)).astype(np.float32)
+        else:
+            scores, ties = index.profile_ranking(primary_use)
+            scores = scores[rows]
+        match_count = len(rows)
+        if top_k is not None and len(rows) > top_k:
+            # Keep the rows above the k-th relevance, then settle the ties at it by score
+            kth = np.partition(relevance, len(relevance) - top_k)[len(relevance) - top_k]
+            above, tied = relevance > kth, relevance == kth
+            tied_rows, _ = top_k_rows(rows[tied], scores[tied], top_k - int(above.sum()), ties)
+            keep = above | np.isin(rows, tied_rows)
+            rows, relevance, scores = rows[keep], relevance[keep], scores[keep]
+        order = np.lexsort((rows if ties is None else ties[rows], -scores, -relevance))[:top_k]
+        frame = _recommendation_frame(df, rows[order], scores[order], match_count)
+        frame['relevance'] = relevance[order]
+        return frame
+    
+    if value_frontier:
+        # The frontier is small, so filter and score it directly
+        rows = index.filter_rows(index.value_frontier, budget, brand_pref, min_scores, min_specs)
+        ties = None
+        if weights is not None:
+            scores = index.weighted_scores(rows, normalize_weights(weights)).astype(np.float32)
+        else:
+            scores, ties = index.profile_ranking(primary_use)
+            scores = scores[rows]
+        top_rows, top_scores = top_k_rows(rows, scores, top_k, ties)
+        return _recommendation_frame(df, top_rows, top_scores, len(rows))
+    
+    if weights is not None:
+        rows, scores = index.weighted_top_k(weights, top_k, budget, brand_pref, min_scores, min_specs)
+        match_count = index.count_matching(budget, brand_pref, min_scores, min_specs)
+        return _recommendation_frame(df, rows, scores, match_count)
+    
+    no_minimums = not _positive_minimums(min_scores) and not _positive_minimums(min_specs)
+    if no_minimums and top_k is not None and top_k <= STAIRCASE_DEPTH:
+        # Budget (and brand) only: answer straight from the precomputed staircase
+        rows, scores = index.budget_staircase(primary_use, brand_pref).top_k(budget, top_k)
+        match_count = index.count_in_budget(budget, brand_pref)
+        return _recommendation_frame(df, rows, scores, match_count)
+    
+    rows = index.candidate_rows(budget, brand_pref, min_scores, min_specs)
+    match_count = len(rows)
+    scores, ties = index.profile_ranking(primary_use)
+    rows, scores = top_k_rows(rows, scores[rows], top_k, ties)
+    return _recommendation_frame(df, rows, scores, match_count)
+
+def output_scores(scores):
+    """float32 ranking scores as float64 rounded to the digits float32 actually carries"""
+    return np.round(np.asarray(scores, dtype=np.float64), SCORE_DECIMALS)
+
+def _recommendation_frame(df, rows, scores, match_count):
+    recommendations = df.iloc[rows].assign(score=output_scores(scores))
+    recommendations.attrs['match_count'] = match_count
+    return recommendations
+
+# Result caching
+RECOMMENDATION_CACHE_SIZE = 4096
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit, miss and eviction counters"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing (outside the lock) and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_recommendation_cache():
+    """The process-wide result cache shared by every session"""
+    return LRUCache(RECOMMENDATION_CACHE_SIZE)
+
+def recommendation_cache_key(df, budget, primary_use, brand_pref=None, min_camera=0, min_battery=0,
+                             top_k=None, weights=None, value_frontier=False):
+    """Normalized filter tuple for a request, or None when df is not a versioned catalog"""
+    version = df.attrs.get('catalog_version')
+    if version is None:
+        return None
+    brand = brand_pref if brand_pref and brand_pref != "Any" else "Any"
+    return (version, float(budget), _profile_key(primary_use, weights), brand,
+            float(min_camera), float(min_battery), top_k, bool(value_frontier))
+
+def _profile_key(primary_use, weights=None):
+    if weights is not None:
+        return (CUSTOM_PROFILE, tuple(np.round(normalize_weights(weights), 6)))
+    # The fingerprint keeps results cached under an edited profile definition from being served again
+    profile = get_profile_registry().get(primary_use)
+    return (profile.name, profile.fingerprint)
+
+def cached_recommendations(df, budget, primary_use, brand_pref=None, min_camera=0, min_battery=0,
+                           top_k=None, weights=None, state=None, value_frontier=False):
+    """get_recommendations() through the process-wide LRU cache.
+
+    On a miss the result is computed with incremental_recommendations() when
+    a per-session state dict is given. Results are shared between sessions
+    and must be treated as read-only.
+    """
+    key = recommendation_cache_key(df, budget, primary_use, brand_pref, min_camera, min_battery, top_k, weights,
+                                   value_frontier)
+    if state is not None and not value_frontier:
+        compute = lambda: incremental_recommendations(df, state, budget, primary_use, brand_pref,
+                                                      min_camera, min_battery, top_k=top_k, weights=weights)
+    else:
+        compute = lambda: get_recommendations(df, budget, primary_use, brand_pref, min_camera, min_battery,
+                                              top_k=top_k, weights=weights, value_frontier=value_frontier)
+    if key is None:
+        return compute()
+    return get_recommendation_cache().get_or_compute(key, compute)
+
+# Incremental filtering
+INCREMENTAL_STATE_BYTES = 1 << 20  # largest candidate set a session keeps between reruns
+
+def _pack_rows(rows, size):
+    """Compact form of a row set out of size rows: ('ids', int32) or ('bitmap', bits), whichever is smaller"""
+    if len(rows) * 4 <= (size + 7) // 8:
+        return 'ids', rows.astype(np.int32)
+    members = np.zeros(size, dtype=bool)
+    members[rows] = True
+    return 'bitmap', np.packbits(members, bitorder='little')
+
+def _unpack_rows(packed, size):
+    kind, values = packed
+    if kind == 'ids':
+        return values.astype(np.int64)
+    return np.flatnonzero(np.unpackbits(values, count=size, bitorder='little'))
+
+def _narrows(previous, current):
+    """True when every filter in current is at least as strict as in previous"""
+    if previous['version'] != current['version'] or previous['profile'] != current['profile']:
+        return False
+    if previous['brand'] != "Any" and previous['brand'] != current['brand']:
+        return False
+    return (current['budget'] <= previous['budget']
+            and current['min_camera'] >= previous['min_camera']
+            and current['min_battery'] >= previous['min_battery'])
+
+def incremental_recommendations(df, state, budget, primary_use, brand_pref=None, min_camera=0, min_battery=0,
+                                top_k=None, weights=None):
+    """get_recommendations() that narrows the previous candidate set when filters only tighten.
+
+    state is a per-session dict (the page keeps it in st.session_state). It
+    holds the last evaluated filters with their candidate rows, packed as
+    int32 ids or a bitmap (whichever is smaller) and dropped above
+    INCREMENTAL_STATE_BYTES. If the new request keeps the catalog and
+    profile and only tightens the budget, brand or minimum scores, just
+    those rows are re-filtered and re-scored. A relaxed filter or a profile
+    change recomputes from the catalog. Budget-only requests skip the state
+    entirely, because the budget staircase answers them faster. Results
+    (ties included) are the same as get_recommendations() gives, so both can
+    fill the shared result cache.
+    """
+    no_minimums = min_camera <= 0 and min_battery <= 0
+    if weights is None and no_minimums and top_k is not None and top_k <= STAIRCASE_DEPTH:
+        return get_recommendations(df, budget, primary_use, brand_pref, top_k=top_k)
+
+    index = get_catalog_index(df)
+    min_scores = {'camera': min_camera, 'battery': min_battery}
+    current = {
+        'version': df.attrs.get('catalog_version'),
+        'profile': _profile_key(primary_use, weights),
+        'brand': brand_pref if brand_pref and brand_pref != "Any" else "Any",
+        'budget': budget,
+        'min_camera': min_camera,
+        'min_battery': min_battery,
+    }
+    previous = state.get('filters')
+    if previous is not None and current['version'] is not None and _narrows(previous, current):
+        rows = _unpack_rows(state['rows'], len(df))
+        mask = index.filter_mask(rows, budget, brand_pref, min_scores)
+        if mask is not None:
+            rows = rows[mask]
+    else:
+        rows = index.candidate_rows(budget, brand_pref, min_scores)
+    packed = _pack_rows(rows, len(df))
+    state.clear()
+    if packed[1].nbytes <= INCREMENTAL_STATE_BYTES:
+        state.update(filters=current, rows=packed)
+
+    if weights is not None:
+        # Ranked on the float64 blend like weighted_top_k(), so equal float32 scores break ties the same way
+        scores, ties = index.weighted_scores(rows, normalize_weights(weights)), None
+    else:
+        scores, ties = index.profile_ranking(primary_use)
+        scores = scores[rows]
+    top_rows, top_scores = top_k_rows(rows, scores, top_k, ties)
+    return _recommendation_frame(df, top_rows, top_scores.astype(np.float32), len(rows))
+
+# Batch recommendations
+BATCH_QUERY_COLUMNS = ['budget', 'primary_use', 'brand_pref', 'min_camera', 'min_battery']
+
+def _normalize_batch_queries(queries):
+    """Fill defaults so equivalent queries share one filter tuple"""
+    normalized = pd.DataFrame(index=queries.index)
+    # A missing budget means no price limit, like the other filters
+    normalized['budget'] = pd.to_numeric(queries['budget']).fillna(np.inf)
+    primary_use = queries['primary_use'] if 'primary_use' in queries else DEFAULT_PROFILE
+    normalized['primary_use'] = pd.Series(primary_use, index=queries.index).where(
+        lambda values: values.isin(get_profile_registry().names()), get_profile_registry().default)
+    brand_pref = queries['brand_pref'] if 'brand_pref' in queries else "Any"
+    normalized['brand_pref'] = pd.Series(brand_pref, index=queries.index).fillna("Any").astype(str)
+    for column in ('min_camera', 'min_battery'):
+        minimum = queries[column] if column in queries else 0
+        # Scores are integers, so a fractional minimum means the next whole score, as in get_recommendations()
+        normalized[column] = np.ceil(pd.to_numeric(pd.Series(minimum, index=queries.index)).fillna(0)).astype(int)
+    return normalized
+
+def get_recommendations_batch(df, queries, top_k=5):
+    """Recommend top_k phones for every row of a query table in one pass.
+
+    queries needs a budget column and may have primary_use, brand_pref,
+    min_camera and min_battery (missing values mean no filter) plus a
+    query_id column (the index is used otherwise). Identical filter tuples
+    are answered once. Tuples sharing a profile, brand and minimum scores
+    filter and score the catalog once, and then answer all of their
+    budgets from one budget staircase. The result is a long
+    (query_id, rank, phone_id, score) table where phone_id is the catalog
+    index label.
+    """
+    query_ids = (queries['query_id'] if 'query_id' in queries else queries.index.to_series()).to_numpy()
+    normalized = _normalize_batch_queries(queries)
+    query_keys = normalized.groupby(BATCH_QUERY_COLUMNS, sort=False).ngroup().to_numpy()
+    distinct = normalized.drop_duplicates().reset_index(drop=True)
+
+    index = get_catalog_index(df)
+    results = [None] * len(distinct)
+    for (primary_use, brand_pref, min_camera, min_battery), group in distinct.groupby(
+            ['primary_use', 'brand_pref', 'min_camera', 'min_battery'], sort=False):
+        if min_camera <= 0 and min_battery <= 0 and top_k <= STAIRCASE_DEPTH:
+            staircase = index.budget_staircase(primary_use, brand_pref)
+        else:
+            rows, _ = index.price_ordered_rows(brand_pref)
+            rows = index.filter_rows(rows, None, min_scores={'camera': min_camera, 'battery': min_battery},
+                                     indexed=('price',))
+            prices = index.columns['price'][rows]
+            scores, ties = index.profile_ranking(primary_use)
+            if len(group) == 1:
+                end = count_at_most(prices, group['budget'].iloc[0])
+                results[group.index[0]] = top_k_rows(rows[:end], scores[rows[:end]], top_k, ties)
+                continue
+            staircase = BudgetStaircase(rows, prices, scores, top_k, ties)
+        for position, budget in zip(group.index, group['budget']):
+            results[position] = staircase.top_k(budget, top_k)
+
+    lengths = np.array([len(rows) for rows, _ in results], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    flat_rows = np.concatenate([rows for rows, _ in results] + [np.empty(0, dtype=np.int64)])
+    flat_scores = np.concatenate([scores for _, scores in results] + [np.empty(0, dtype=np.float32)])
+
+    # Expand each query to its distinct tuple's ranked rows without a Python loop
+    counts = lengths[query_keys]
+    query_positions = np.repeat(np.arange(len(query_keys)), counts)
+    ranks = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    sources = offsets[query_keys][query_positions] + ranks
+    phone_ids = df.index.to_numpy()
+    if phone_ids.dtype.kind in 'iu' and len(phone_ids) and phone_ids.max() <= np.iinfo(np.int32).max:
+        phone_ids = phone_ids.astype(np.int32)
+    return pd.DataFrame({
+        'query_id': query_ids[query_positions],
+        'rank': (ranks + 1).astype(np.int16),
+        'phone_id': phone_ids[flat_rows[sources]],
+        'score': output_scores(flat_scores[sources]),
+    })
+
+# Explanations
+EXPLANATION_CACHE_SIZE = 4096
+
+# primary use -> (score column, [(minimum score, bullet template), ...] best tier first)
+PROFILE_EXPLANATIONS = {
+    "Photography": ('camera', [
+        (90, "📸 Exceptional camera quality ({value}/100) perfect for photography enthusiasts"),
+        (80, "📸 Very good camera ({value}/100) suitable for most photography needs"),
+    ]),
+    "Gaming": ('performance', [
+        (90, "🎮 Top-tier performance ({value}/100) handles any game smoothly"),
+        (80, "🎮 Good gaming performance ({value}/100) for most mobile games"),
+    ]),
+    "Battery Life": ('battery', [
+        (85, "🔋 Excellent battery life ({value}/100) for all-day usage"),
+        (75, "🔋 Good battery life ({value}/100) for regular usage"),
+    ]),
+}
+
+@st.cache_resource(show_spinner=False)
+def get_explanation_cache():
+    """Process-wide memo of rendered explanation bullets"""
+    return LRUCache(EXPLANATION_CACHE_SIZE)
+
+def _render_explanations(phones, primary_use, budget):
+    """Explanation bullets for every row, with the tiers picked column-wise"""
+    lines = [[] for _ in range(len(phones))]
+
+    if primary_use in PROFILE_EXPLANATIONS:
+        column, tiers = PROFILE_EXPLANATIONS[primary_use]
+        values = phones[column].to_numpy()
+        tier = np.select([values >= minimum for minimum, _ in tiers], np.arange(len(tiers)), -1)
+        for i in np.flatnonzero(tier >= 0):
+            lines[i].append(tiers[tier[i]][1].format(value=values[i]))
+
+    prices = phones['price'].to_numpy()
+    value_tier = np.select([prices <= budget * 0.8, prices <= budget * 0.9], [0, 1], -1)
+    for i in np.flatnonzero(value_tier == 0):
+        lines[i].append(f"💰 Great value at ${prices[i]} - well within your ${budget} budget")
+    for i in np.flatnonzero(value_tier == 1):
+        lines[i].append(f"💰 Good value at ${prices[i]} for the features offered")
+
+    for i, features in enumerate(phones['features']):
+        if len(features) > 0:
+            lines[i].append(f"✨ Key features: {', '.join(features[:3])}")
+    return lines
+
+def build_explanations(phones, primary_use, budget):
+    """Explanation bullet lists for every phone in a frame.
+
+    Rendered lists are memoized per (catalog version, phone id, primary use,
+    budget) in a shared LRU. The budget is already bucketed by the slider's
+    step and appears in the text. Only the cache misses are rendered, and
+    they are rendered together.
+    """
+    version = phones.attrs.get('catalog_version')
+    if version is None:
+        return _render_explanations(phones, primary_use, budget)
+
+    cache = get_explanation_cache()
+    keys = [(version, phone_id, primary_use, budget) for phone_id in phones.index]
+    explanations = [cache.get(key) for key in keys]
+    missing = [i for i, lines in enumerate(explanations) if lines is None]
+    if missing:
+        rendered = _render_explanations(phones.iloc[missing], primary_use, budget)
+        for i, lines in zip(missing, rendered):
+            cache.put(keys[i], lines)
+            explanations[i] = lines
+    return explanations
+
+# Radar charts
+RADAR_CACHE_SIZE = 1024
+RADAR_CATEGORIES = ['Camera', 'Battery', 'Performance', 'Display']
+RADAR_THEMES = {
+    'neon': {'line': '#00f5ff', 'fill': 'rgba(0, 245, 255, 0.2)', 'grid': 'rgba(255, 255, 255, 0.2)', 'text': 'white'},
+}
+DEFAULT_RADAR_THEME = 'neon'
+
+@st.cache_resource(show_spinner=False)
+def get_radar_cache():
+    """Process-wide LRU of built radar figures and their serialized sizes"""
+    return LRUCache(RADAR_CACHE_SIZE)
+
+def _radar_trace(name, values, colors, **subplot):
+    return go.Scatterpolar(r=list(values), theta=RADAR_CATEGORIES, fill='toself', name=name,
+                           line=dict(color=colors['line'], width=2), fillcolor=colors['fill'], **subplot)
+
+def _radar_axes(colors):
+    return dict(
+        radialaxis=dict(visible=True, range=[0, 100], gridcolor=colors['grid'], color=colors['text']),
+        angularaxis=dict(gridcolor=colors['grid'], color=colors['text']),
+    )
+
+def _radar_layout(colors, height):
+    return dict(showlegend=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color=colors['text'], size=12), height=height)
+
+def _build_radar(name, values, theme):
+    colors = RADAR_THEMES[theme]
+    fig = go.Figure(_radar_trace(name, values, colors))
+    fig.update_layout(polar=_radar_axes(colors), **_radar_layout(colors, 300))
+    return fig
+
+def _build_radar_grid(phones, theme):
+    colors = RADAR_THEMES[theme]
+    fig = make_subplots(rows=1, cols=len(phones), specs=[[{'type': 'polar'}] * len(phones)],
+                        subplot_titles=[name for name, _ in phones])
+    for i, (name, values) in enumerate(phones, start=1):
+        fig.add_trace(_radar_trace(name, values, colors), row=1, col=i)
+    fig.update_polars(**_radar_axes(colors))
+    fig.update_annotations(font=dict(color=colors['text'], size=12))
+    fig.update_layout(**_radar_layout(colors, 320))
+    return fig
+
+def _cached_figure(key, build, render):
+    """Fetch a figure from the radar cache, timing and sizing it on a miss"""
+    def compute():
+        started = time.perf_counter()
+        fig = build()
+        render['built'] += 1
+        render['build_ms'] += (time.perf_counter() - started) * 1000
+        return fig, len(pio.to_json(fig, validate=False))
+
+    fig, payload = get_radar_cache().get_or_compute(key, compute)
+    render['figures'] += 1
+    render['payload_bytes'] += payload
+    return fig
+
+def build_radar_charts(phones, theme=DEFAULT_RADAR_THEME, combined=False):
+    """Radar figures for the score columns of phones, plus this call's render stats.
+
+    Figures are cached across sessions by (phone name, score values, theme),
+    so a rerun only builds charts for phones or scores it has not drawn
+    before. With combined=True all phones share one multi-subplot figure,
+    which also sends the layout template once instead of once per phone.
+    """
+    entries = list(zip(phones['name'], phones[SCORE_COLUMNS].itertuples(index=False, name=None)))
+    render = {'figures': 0, 'built': 0, 'build_ms': 0.0, 'payload_bytes': 0}
+    if combined:
+        key = ('grid', tuple(entries), theme)
+        figures = [_cached_figure(key, lambda: _build_radar_grid(entries, theme), render)] if entries else []
+    else:
+        figures = [_cached_figure(('single', name, values, theme),
+                                  lambda name=name, values=values: _build_radar(name, values, theme), render)
+                   for name, values in entries]
+    return figures, render
+
+# Export formats
+EXPORT_COLUMNS = ['name', 'price', 'camera', 'battery', 'performance', 'display', 'brand', 'storage', 'ram']
+EXPORT_CHUNK_SIZE = 50_000
+# format label -> (file extension, mime type, writer, compression codec)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv', 'csv', None),
+    'CSV (gzip)': ('csv.gz', 'application/gzip', 'csv', 'gzip'),
+    'CSV (zstd)': ('csv.zst', 'application/zstd', 'csv', 'zstd'),
+    'JSON': ('json', 'application/json', 'json', None),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet', 'parquet', None),
+    'Arrow': ('arrow', 'application/vnd.apache.arrow.file', 'arrow', None),
+}
+
+def _export_chunks(frame, chunk_size):
+    """Yield frame's export columns as display-formatted slices of at most chunk_size rows"""
+    columns = [column for column in EXPORT_COLUMNS if column in frame.columns]
+    for start in range(0, max(len(frame), 1), chunk_size):
+        chunk = format_spec_columns(frame.iloc[start:start + chunk_size][columns])
+        # Plain strings keep the Arrow schema identical from one slice to the next
+        chunk['brand'] = chunk['brand'].astype(str)
+        yield chunk
+
+def write_export(frame, export_format, sink, chunk_size=EXPORT_CHUNK_SIZE):
+    """Serialize frame to a pyarrow output stream in one of EXPORT_FORMATS, a slice at a time.
+
+    Only one formatted slice is alive at once, so exporting the full ranked
+    result costs one copy of the output plus a chunk, not a copy per step.
+    """
+    _, _, writer_kind, compression = EXPORT_FORMATS[export_format]
+    stream = pa.CompressedOutputStream(sink, compression) if compression else sink
+    chunks = _export_chunks(frame, chunk_size)
+    if writer_kind == 'json':
+        stream.write(b'[')
+        written = False
+        for chunk in chunks:
+            if len(chunk):
+                body = chunk.to_json(orient='records', indent=2)[1:-1].rstrip()
+                stream.write((',' if written else '').encode() + body.encode())
+                written = True
+        stream.write(b'\n]' if written else b']')
+    else:
+        tables = (pa.Table.from_pandas(chunk, preserve_index=False) for chunk in chunks)
+        first = next(tables)
+        if writer_kind == 'csv':
+            writer = pa.csv.CSVWriter(stream, first.schema)
+        elif writer_kind == 'parquet':
+            writer = pq.ParquetWriter(stream, first.schema)
+        else:
+            writer = pa.ipc.new_file(stream, first.schema)
+        with writer:
+            writer.write_table(first)
+            for table in tables:
+                writer.write_table(table)
+    if compression:
+        stream.close()
+
+def export_payload(frame, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Return frame serialized in export_format as bytes"""
+    sink = pa.BufferOutputStream()
+    write_export(frame, export_format, sink, chunk_size)
+    return sink.getvalue().to_pybytes()
+
+# Feedback store
+FEEDBACK_DB_ENV_VAR = "PHONEHUB_FEEDBACK_DB"
+FEEDBACK_DB_FILENAME = "feedback.sqlite3"
+FEEDBACK_RATINGS = ['😞 Not helpful', '😐 Somewhat helpful', '😊 Very helpful', '🤩 Extremely helpful']
+FEEDBACK_FILTER_KEYS = ['budget', 'primary_use', 'custom_weights', 'brand_pref', 'min_camera', 'min_battery',
+                        'value_frontier']
+FEEDBACK_QUEUE_SIZE = 10_000
+FEEDBACK_BATCH_SIZE = 512
+FEEDBACK_SUBMIT_TIMEOUT = 0.25   # seconds a submit may wait for queue space before giving up
+FEEDBACK_FLUSH_SECONDS = 0.5     # longest a queued submission waits before it is written
+FEEDBACK_SYNC_SECONDS = 5.0      # how often the WAL is checkpointed (and fsynced) into the database
+FEEDBACK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    submitted_at REAL NOT NULL,
+    catalog_version TEXT,
+    primary_use TEXT,
+    rating INTEGER NOT NULL,
+    comment TEXT,
+    filters TEXT NOT NULL,
+    phones TEXT NOT NULL
+)
+"""
+FEEDBACK_COLUMNS = ['submitted_at', 'catalog_version', 'primary_use', 'rating', 'comment', 'filters', 'phones']
+
+def feedback_db_path(path=None):
+    """Feedback database path: the argument, $PHONEHUB_FEEDBACK_DB, or the user's data directory.
+
+    The default lives under $XDG_DATA_HOME (~/.local/share) rather than the
+    working directory, so it does not depend on where the app was started.
+    """
+    path = path or os.environ.get(FEEDBACK_DB_ENV_VAR)
+    if not path:
+        data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+        path = os.path.join(data_home, 'phonehub', FEEDBACK_DB_FILENAME)
+    return os.path.abspath(os.path.expanduser(path))
+
+def feedback_record(rating, comment, filters, phones, catalog_version=None):
+    """Build a feedback row; filters is a dict and phones the recommended phone ids in rank order.
+
+    Phone ids are catalog index labels (names are not unique), so they are
+    only meaningful together with catalog_version.
+    """
+    filters = {key: filters.get(key) for key in FEEDBACK_FILTER_KEYS}
+    return (time.time(), catalog_version, filters['primary_use'], rating, comment or None,
+            json.dumps(filters, default=str), json.dumps(list(phones)))
+
+def open_feedback_db(path=None):
+    """Open (creating if needed) the feedback database in WAL mode"""
+    path = feedback_db_path(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # Commits skip the fsync; the periodic checkpoint makes them durable instead
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(FEEDBACK_SCHEMA)
+    return connection
+
+class FeedbackWriter:
+    """Write-behind queue that batch-appends feedback rows to SQLite from a background thread.
+
+    submit() only enqueues, so the render path never touches the disk. The
+    queue is bounded: when the writer falls behind, submit() waits briefly
+    and then reports back-pressure by returning False. Pending rows are
+    flushed by close(), which also runs at interpreter shutdown.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path=None, max_queued=FEEDBACK_QUEUE_SIZE):
+        self.path = feedback_db_path(path)
+        self._queue = queue.Queue(max_queued)
+        self._lock = threading.Lock()
+        self.written = self.rejected = self.batches = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record, timeout=FEEDBACK_SUBMIT_TIMEOUT):
+        """Queue one feedback_record(); returns False if the queue stayed full for timeout seconds"""
+        if not self._thread.is_alive():
+            return False
+        try:
+            self._queue.put(record, timeout=timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+    def _next_batch(self):
+        """Block up to FEEDBACK_FLUSH_SECONDS for a row, then drain what else is already queued"""
+        try:
+            batch = [self._queue.get(timeout=FEEDBACK_FLUSH_SECONDS)]
+        except queue.Empty:
+            return []
+        while len(batch) < FEEDBACK_BATCH_SIZE and batch[-1] is not self._STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            connection = open_feedback_db(self.path)
+        except (sqlite3.Error, OSError) as error:
+            self.error = error
+            return
+        insert = f"INSERT INTO feedback ({', '.join(FEEDBACK_COLUMNS)}) VALUES ({', '.join('?' * len(FEEDBACK_COLUMNS))})"
+        last_sync = time.monotonic()
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if batch and batch[-1] is self._STOP:
+                batch.pop()
+                stopping = True
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(insert, batch)
+                except sqlite3.Error as error:
+                    self.error = error
+                else:
+                    with self._lock:
+                        self.written += len(batch)
+                        self.batches += 1
+            if stopping or time.monotonic() - last_sync >= FEEDBACK_SYNC_SECONDS:
+                connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                last_sync = time.monotonic()
+        connection.close()
+
+    def close(self, timeout=10.0):
+        """Flush everything queued so far and stop the worker"""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queued': self._queue.maxsize,
+                'written': self.written,
+                'batches': self.batches,
+                'rejected': self.rejected,
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_writer():
+    """The process-wide feedback writer shared by every session"""
+    return FeedbackWriter()
+
+# Additional features and improvements for PhoneHub
+COMPARISON_CACHE_SIZE = 1024
+
+# Add after the main function, before if __name__ == "__main__":
+
+# spec column -> (comparison table label, +1 when higher is better / -1 when lower is / 0 when neither)
+COMPARISON_SPECS = {
+    'price': ('Price', -1),
+    'camera': ('Camera Score', 1),
+    'battery': ('Battery Score', 1),
+    'performance': ('Performance', 1),
+    'display': ('Display', 1),
+    'storage': ('Storage', 1),
+    'ram': ('RAM', 1),
+    'screen_size': ('Screen Size', 0),
+    'score': ('Overall Score', 1),
+}
+BEST_CELL_STYLE = 'background-color: rgba(0, 255, 136, 0.25); font-weight: bold'
+
+def create_comparison_table(phones_df):
+    """Create a detailed comparison table for selected phones"""
+    if len(phones_df) == 0:
+        return None
+    
+    formatted = format_spec_columns(phones_df)
+    table = pd.DataFrame({'Phone': formatted['name'].to_numpy()})
+    table['Price'] = '$' + formatted['price'].astype(str).to_numpy()
+    for column in SCORE_COLUMNS:
+        table[COMPARISON_SPECS[column][0]] = formatted[column].astype(str).to_numpy() + '/100'
+    for column in ['storage', 'ram', 'screen_size']:
+        table[COMPARISON_SPECS[column][0]] = formatted[column].to_numpy()
+    if 'score' in formatted.columns:
+        table['Overall Score'] = formatted['score'].map('{:.1f}/100'.format).to_numpy()
+    else:
+        table['Overall Score'] = "N/A"
+    return table
+
+class ComparisonMatrix:
+    """Numeric specs of the phones being compared, with every pairwise delta precomputed.
+
+    deltas[i, j, s] is phone i minus phone j on spec s (NaN where either
+    spec is unknown). That makes any baseline a slice, not a recomputation.
+    best marks the winning phone(s) of every spec that has a direction.
+    """
+
+    def __init__(self, phones):
+        self.names = phones['name'].tolist()
+        self.columns = [column for column in COMPARISON_SPECS if column in phones.columns]
+        values = phones[self.columns].to_numpy(dtype=np.float64)
+        unknown = np.isin(self.columns, list(NUMERIC_SPEC_COLUMNS)) & (values <= 0)
+        self.values = np.where(unknown, np.nan, values)
+        self.deltas = self.values[:, None, :] - self.values[None, :, :]
+        self.direction = np.array([COMPARISON_SPECS[column][1] for column in self.columns])
+        signed = self.values * self.direction
+        with np.errstate(invalid='ignore'):
+            self.best = (signed == np.nanmax(np.where(np.isnan(signed), -np.inf, signed), axis=0)) & (self.direction != 0)
+            # wins[i, j]: number of specs on which phone i beats phone j
+            self.wins = (self.deltas * self.direction > 0).sum(axis=2)
+
+    def best_cells(self, table):
+        """CSS for a create_comparison_table() frame, highlighting the best value of every spec"""
+        styles = pd.DataFrame('', index=table.index, columns=table.columns)
+        for s, column in enumerate(self.columns):
+            styles[COMPARISON_SPECS[column][0]] = np.where(self.best[:, s], BEST_CELL_STYLE, '')
+        return styles
+
+    def delta_table(self, baseline):
+        """Signed per-spec differences of every phone against the phone at position baseline"""
+        deltas = self.deltas[:, baseline, :]
+        table = pd.DataFrame({'Phone': self.names})
+        for s, column in enumerate(self.columns):
+            delta = pd.Series(deltas[:, s])
+            precision = {'score': '.1f', 'screen_size': '.2f', 'storage': 'g', 'ram': 'g'}.get(column, '.0f')
+            magnitude = delta.abs().map(f'{{:,{precision}}}'.format)
+            sign = np.where(delta > 0, '+', np.where(delta < 0, '−', '±'))
+            unit = {'price': '$', 'storage': '', 'ram': ''}.get(column, '')
+            suffix = {'storage': 'GB', 'ram': 'GB', 'screen_size': '"'}.get(column, '')
+            text = sign + unit + magnitude + suffix
+            table[COMPARISON_SPECS[column][0]] = np.where(delta.isna(), "N/A", text)
+        table['Better On'] = [f"{wins} / {int((self.direction != 0).sum())}" for wins in self.wins[:, baseline]]
+        return table
+
+@st.cache_resource(show_spinner=False)
+def get_comparison_cache():
+    """Process-wide memo of ComparisonMatrix objects per compared selection"""
+    return LRUCache(COMPARISON_CACHE_SIZE)
+
+def comparison_matrix(phones):
+    """The (memoized) ComparisonMatrix for a selection of catalog rows"""
+    version = phones.attrs.get('catalog_version')
+    if version is None:
+        return ComparisonMatrix(phones)
+    scores = tuple(phones['score'].round(4)) if 'score' in phones.columns else ()
+    key = (version, tuple(phones.index), scores)
+    return get_comparison_cache().get_or_compute(key, lambda: ComparisonMatrix(phones))
+
+@st.fragment
+def add_comparison_section(recommendations):
+    """Add a comparison section for top phones"""
+    if len(recommendations) > 1:
+        st.markdown("## 🔍 Detailed Comparison")
+        
+        # Allow user to select phones for comparison
+        phone_names = recommendations['name'].tolist()
+        positions = {name: i for i, name in reversed(list(enumerate(phone_names)))}
+        selected_phones = st.multiselect(
+            "Select phones to compare:",
+            phone_names,
+            default=phone_names[:3] if len(phone_names) >= 3 else phone_names
+        )
+        
+        if selected_phones:
+            selected_data = recommendations.iloc[[positions[name] for name in selected_phones]]
+            comparison_df = create_comparison_table(selected_data)
+            
+            if comparison_df is not None:
+                matrix = comparison_matrix(selected_data)
+                st.dataframe(
+                    comparison_df.style.apply(matrix.best_cells, axis=None),
+                    use_container_width=True,
+                    hide_index=True
+                )
+                st.caption("Highlighted cells are the best value for each spec.")
+                
+                if len(selected_phones) > 1:
+                    baseline = st.selectbox("📏 Compare against:", selected_phones)
+                    st.dataframe(
+                        matrix.delta_table(selected_phones.index(baseline)),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                
+                # Add comparison charts
+                col1, col2 = st.columns(2)
                 
                 with col1:
                     # Performance comparison
@@ -856,6 +2960,7 @@ def add_comparison_section(recommendations):
                     )
                     st.plotly_chart(fig_price, use_container_width=True)
 
+@st.fragment
 def add_search_functionality(df):
     """Add search functionality for specific phone models"""
     st.markdown("## 🔍 Search Specific Models")
@@ -863,12 +2968,20 @@ def add_search_functionality(df):
     search_query = st.text_input("Search for a specific phone model:", placeholder="e.g., iPhone 15, Galaxy S24, Pixel 8")
     
     if search_query:
-        filtered_phones = df[df['name'].str.contains(search_query, case=False, na=False)]
+        name_search = get_catalog_index(df).name_search
+        completions = df['name'].iloc[name_search.complete(search_query, 5)].tolist()
+        if completions:
+            st.caption("Suggestions: " + " · ".join(completions))
+        rows, match_ratios = name_search.search(search_query)
+        filtered_phones = df.iloc[rows]
         
         if len(filtered_phones) > 0:
-            st.success(f"Found {len(filtered_phones)} phone(s) matching '{search_query}'")
+            if match_ratios[0] < 1:
+                st.info(f"No exact match for '{search_query}'. Showing the closest names instead.")
+            else:
+                st.success(f"Found {int((match_ratios == 1).sum())} phone(s) matching '{search_query}'")
             
-            for _, phone in filtered_phones.iterrows():
+            for row, (_, phone) in zip(rows, filtered_phones.iterrows()):
                 st.markdown(f"""
                 <div class="phone-card">
                     <div class="phone-name">{phone['name']}</div>
@@ -880,17 +2993,55 @@ def add_search_functionality(df):
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
+                if st.button("🔎 Focus", key=f"focus_{row}"):
+                    st.session_state.selected_phone = phone['name']
+                    add_recently_viewed(phone['name'])
+                    # The focused card is drawn outside this fragment
+                    st.rerun()
         else:
             st.warning(f"No phones found matching '{search_query}'")
 
-def add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery):
+@st.fragment
+def add_feature_search(df, budget, primary_use, brand_pref, min_camera, min_battery, weights=None):
+    """Free-text search over features, pros and cons, within the sidebar filters"""
+    st.markdown("## 🧠 Search by Features")
+    query = st.text_input("Describe what you need:", placeholder="e.g., fast charging under $700 for gaming, IP68, wireless charging")
+    
+    if query:
+        parsed = parse_feature_query(query)
+        if not parsed['text']:
+            st.warning("Add a feature to look for, like 'wireless charging' or 'IP68'.")
+            return
+        results = search_phones(df, query, budget, primary_use, brand_pref, min_camera, min_battery, weights=weights)
+        stated = [f"budget ${parsed['budget']:,.0f}"] if parsed['budget'] is not None else []
+        stated += [f"use: {parsed['primary_use']}"] if parsed['primary_use'] is not None else []
+        note = f" ({', '.join(stated)})" if stated else ""
+        
+        if len(results) > 0:
+            st.success(f"Found {results.attrs['match_count']} phone(s) mentioning '{parsed['text']}'{note}")
+            for _, phone in results.iterrows():
+                st.markdown(f"""
+                <div class="phone-card">
+                    <div class="phone-name">{phone['name']}</div>
+                    <div class="phone-details">
+                        <strong>Price:</strong> ${phone['price']} | 
+                        <strong>Score:</strong> {phone['score']:.1f}/100 | 
+                        <strong>Relevance:</strong> {phone['relevance']:.2f}<br>
+                        ✨ {' • '.join(phone['features'])}
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.warning(f"No phones within your filters mention '{parsed['text']}'{note}")
+
+def add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery, value_frontier=False):
     """Add a summary of applied filters"""
     st.markdown("## 🎯 Applied Filters")
     
     filters = []
     if budget < 1500:
         filters.append(f"Budget: Up to ${budget}")
-    if primary_use != "General Use":
+    if primary_use != get_profile_registry().default:
         filters.append(f"Primary Use: {primary_use}")
     if brand_pref != "Any":
         filters.append(f"Brand: {brand_pref}")
@@ -898,6 +3049,8 @@ def add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery)
         filters.append(f"Min Camera Score: {min_camera}/100")
     if min_battery > 0:
         filters.append(f"Min Battery Score: {min_battery}/100")
+    if value_frontier:
+        filters.append("Best value only")
     
     if filters:
         filter_text = " | ".join(filters)
@@ -907,61 +3060,137 @@ def add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery)
         </div>
         """, unsafe_allow_html=True)
 
-def export_recommendations(recommendations):
-    """Add export functionality for recommendations"""
+@st.fragment
+def export_recommendations(df, recommendations, budget, primary_use, brand_pref, min_camera, min_battery,
+                           weights=None, value_frontier=False):
+    """Add export functionality for recommendations.
+
+    The file is only built when the download button is clicked, so picking a
+    format or scope costs nothing; the full ranked list is ranked again at
+    that point instead of being kept around per session.
+    """
     if len(recommendations) > 0:
         st.markdown("## 📥 Export Recommendations")
         
-        export_data = recommendations[['name', 'price', 'camera', 'battery', 'performance', 'display', 'brand', 'storage', 'ram']].copy()
-        
+        match_count = recommendations.attrs['match_count']
         col1, col2 = st.columns(2)
-        
         with col1:
-            csv_data = export_data.to_csv(index=False)
-            st.download_button(
-                label="📄 Download as CSV",
-                data=csv_data,
-                file_name=f"phone_recommendations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
-        
+            export_format = st.selectbox("🗂️ Format", list(EXPORT_FORMATS), key="export_format")
         with col2:
-            json_data = export_data.to_json(orient='records', indent=2)
-            st.download_button(
-                label="📄 Download as JSON",
-                data=json_data,
-                file_name=f"phone_recommendations_{datetime.now().strftime('%Y%m%d_%M%S')}.json",
-                mime="application/json"
+            scopes = [f"Shown recommendations ({len(recommendations)})", f"Full ranked list ({match_count:,})"]
+            full_list = st.radio("📋 Rows", scopes, key="export_scope") == scopes[1]
+        
+        def build_export():
+            ranked = recommendations
+            if full_list:
+                ranked = get_recommendations(df, budget, primary_use, brand_pref, min_camera, min_battery,
+                                             top_k=None, weights=weights, value_frontier=value_frontier)
+            return export_payload(ranked, export_format)
+        
+        extension, mime, _, _ = EXPORT_FORMATS[export_format]
+        st.download_button(
+            label=f"📄 Download as {export_format}",
+            data=build_export,
+            file_name=f"phone_recommendations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+            mime=mime,
+            on_click="ignore"
+        )
+
+@st.fragment
+def add_device_comparison(df):
+    """Compare any number of devices from the catalog by name, alias or shorthand"""
+    st.markdown("## 🤝 Compare Any Devices")
+    st.info("Enter two or more device names separated by commas. Shorthand like 'S24U' or '15 PM' works too.")
+    devices = st.text_input("Device Names", "iPhone 15 Pro Max, Samsung Galaxy S24 Ultra")
+    compare_btn = st.button("Compare Devices")
+    if compare_btn:
+        resolver = get_catalog_index(df).name_resolver
+        rows, unknown = [], []
+        for device in (part.strip() for part in devices.split(',')):
+            if not device:
+                continue
+            row, how = resolver.resolve(device)
+            if row is None:
+                unknown.append(device)
+                continue
+            if how != 'exact':
+                st.caption(f"'{device}' → {df['name'].iloc[row]}")
+            if row not in rows:
+                rows.append(row)
+        if unknown:
+            st.error(f"Could not find: {', '.join(unknown)}. Please check spelling or be more specific.")
+        elif len(rows) < 2:
+            st.error("Enter at least two different devices to compare.")
+        else:
+            compare_df = format_spec_columns(df.iloc[rows])
+            st.markdown("### 📊 Device Comparison Table")
+            st.dataframe(compare_df[['name','price','camera','battery','performance','display','storage','ram','screen_size','os']], use_container_width=True, hide_index=True)
+            # Visual comparison
+            st.markdown("### 📈 Visual Comparison")
+            fig = go.Figure()
+            for _, row in compare_df.iterrows():
+                fig.add_trace(go.Bar(
+                    x=['Camera','Battery','Performance','Display'],
+                    y=[row['camera'], row['battery'], row['performance'], row['display']],
+                    name=row['name']
+                ))
+            fig.update_layout(
+                barmode='group',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='white'),
+                title_font=dict(color='#00f5ff', size=16),
+                title="Specs Comparison"
             )
+            st.plotly_chart(fig, use_container_width=True)
 
-# Enhanced main function with additional features
-def enhanced_main():
-    # All the existing code from main() function goes here...
-    # Then add these additional features at the end, before the footer:
-    
-    # Add the additional features
-    add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery)
-    add_comparison_section(recommendations)
-    add_search_functionality(df)
-    export_recommendations(recommendations)
-    
-    # Add a feedback section
+@st.fragment
+def add_feedback_section(recommendations):
+    """Collect a rating and free-text feedback on the recommendations"""
     st.markdown("## 💬 Feedback")
-    
     col1, col2 = st.columns(2)
-    
     with col1:
         rating = st.select_slider(
             "How helpful were these recommendations?",
-            options=['😞 Not helpful', '😐 Somewhat helpful', '😊 Very helpful', '🤩 Extremely helpful'],
+            options=FEEDBACK_RATINGS,
             value='😊 Very helpful'
         )
-    
     with col2:
         feedback = st.text_area("Any additional feedback or suggestions?", height=100)
-        
         if st.button("Submit Feedback"):
-            st.success("Thank you for your feedback! It helps us improve our recommendations.")
+            record = feedback_record(FEEDBACK_RATINGS.index(rating), feedback, st.session_state,
+                                     recommendations.index.tolist(), recommendations.attrs.get('catalog_version'))
+            if get_feedback_writer().submit(record):
+                st.success("Thank you for your feedback! It helps us improve our recommendations.")
+            else:
+                st.warning("We're receiving a lot of feedback right now. Please try again in a moment.")
+
+@st.fragment
+def add_market_analysis(df):
+    """Price/performance scatter, brand share and category summary for the whole catalog"""
+    figures = get_catalog_index(df).market_figures
+    st.markdown("## 📊 Market Analysis")
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(df) > SCATTER_POINT_LIMIT:
+            # Large catalogs start binned; narrowing the window brings back per-phone points
+            prices = get_catalog_index(df).price_index[1]
+            low, high = int(math.floor(prices[0])), int(math.ceil(prices[-1]))
+            price_range = st.slider("🔎 Zoom: price range", low, high, (low, high))
+            performance_range = st.slider("🔎 Zoom: performance range", 0, 100, (0, 100))
+            if price_range == (low, high) and performance_range == (0, 100):
+                fig_scatter, in_view = figures['scatter'], len(df)
+            else:
+                fig_scatter, in_view = price_performance_view(df, price_range, performance_range)
+            st.plotly_chart(fig_scatter, use_container_width=True)
+            if in_view > SCATTER_POINT_LIMIT:
+                st.caption(f"{in_view:,} phones in view, shown as density. Zoom in to {SCATTER_POINT_LIMIT:,} "
+                           f"or fewer to see individual phones.")
+        else:
+            st.plotly_chart(figures['scatter'], use_container_width=True)
+    with col2:
+        st.plotly_chart(figures['pie'], use_container_width=True)
+    st.dataframe(figures['categories'], use_container_width=True, hide_index=True)
 
 # Add a 'Recently Viewed' feature using session state
 def add_recently_viewed(phone_name):
@@ -984,14 +3213,44 @@ def show_recently_viewed(df):
                 st.session_state.selected_phone = phone_name
                 # Optionally, scroll to or highlight this phone in the main view
 
+def show_engine_stats(radar_render=None):
+    """Show the shared cache counters and this rerun's chart costs in a collapsed sidebar panel"""
+    caches = [("Result cache", get_recommendation_cache()), ("Explanation cache", get_explanation_cache()),
+              ("Radar cache", get_radar_cache())]
+    with st.sidebar.expander("⚙️ Engine Stats"):
+        if radar_render is not None:
+            st.markdown(f"""
+            **Radar charts this rerun:** {radar_render['figures']} figures, {radar_render['built']} built  
+            **Build time:** {radar_render['build_ms']:.1f} ms · **Payload:** {radar_render['payload_bytes'] / 1024:.1f} KB
+            """)
+        for label, cache in caches:
+            stats = cache.stats()
+            st.markdown(f"""
+            **{label}:** {stats['entries']:,} / {stats['max_entries']:,} entries  
+            **Hits:** {stats['hits']:,} · **Misses:** {stats['misses']:,} · **Evictions:** {stats['evictions']:,}  
+            **Hit rate:** {stats['hit_rate']:.1%}
+            """)
+        registry = get_profile_registry()
+        feedback = get_feedback_writer().stats()
+        st.markdown(f"""
+        **Profiles:** {len(registry.profiles)} from {registry.path or 'built-in defaults'} · **Reloads:** {registry.reloads}  
+        **Profile weights:** {registry.weights_version}  
+        **Feedback queue:** {feedback['queued']:,} / {feedback['max_queued']:,} queued  
+        **Written:** {feedback['written']:,} in {feedback['batches']:,} batches · **Rejected:** {feedback['rejected']:,}
+        """)
+        if registry.error is not None:
+            st.warning(f"Profile config not reloaded: {registry.error}")
+
 # Add a function to focus on a selected phone if set
 
 def focus_on_selected_phone(df):
     if 'selected_phone' in st.session_state:
-        phone = df[df['name'] == st.session_state.selected_phone]
-        if not phone.empty:
+        row, _ = get_catalog_index(df).name_resolver.resolve(st.session_state.selected_phone)
+        if row is not None:
+            primary_use = st.session_state.get('primary_use', get_profile_registry().default)
+            phone = df.iloc[[row]]
+            explanations = build_explanations(phone, primary_use, st.session_state.get('budget', 1500))[0]
             phone = phone.iloc[0]
-            explanations = generate_explanation(phone, st.session_state.get('primary_use', 'General Use'), st.session_state.get('budget', 1500))
             st.markdown(f"""
             <div class="phone-card">
                 <div class="phone-name">{phone['name']}</div>
@@ -1008,8 +3267,23 @@ def focus_on_selected_phone(df):
             </div>
             """, unsafe_allow_html=True)
 
+            alternatives = cheaper_alternatives(df, row, primary_use, st.session_state.get('custom_weights'))
+            if alternatives.empty:
+                st.caption(f"💎 Nothing cheaper matches this phone on the scores that matter for {primary_use}.")
+            else:
+                lines = [f"• <strong>{alt['name']}</strong>: ${alt['price']} (save ${round(phone['price'] - alt['price'], 2)}), "
+                         f"score {alt['score']:.1f}"
+                         for _, alt in alternatives.iterrows()]
+                st.markdown(f"""
+                <div class="explanation">
+                    <strong>💸 Cheaper alternatives, at least as good for {primary_use}:</strong><br>
+                    {'<br>'.join(lines)}
+                </div>
+                """, unsafe_allow_html=True)
+
 # Integrate all features in main()
 def main():
+    setup_page()
     # Header
     st.markdown('<h1 class="main-header">📱 PhoneHub</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">AI-Powered Phone Recommendations Tailored Just for You</p>', unsafe_allow_html=True)
@@ -1021,27 +3295,54 @@ def main():
     st.sidebar.markdown("## 🎯 Find Your Perfect Phone")
     
     budget = st.sidebar.slider("💰 Budget (USD)", 300, 1500, 800, 50)
+    registry = get_profile_registry()
+    profiles = registry.names()
     primary_use = st.sidebar.selectbox("🎯 Primary Use", 
-                                      ["General Use", "Photography", "Gaming", "Battery Life"])
+                                      profiles + [CUSTOM_PROFILE], index=profiles.index(registry.default))
+    custom_weights = None
+    if primary_use == CUSTOM_PROFILE:
+        st.sidebar.markdown("### ⚖️ Custom Weights")
+        custom_weights = {
+            'camera': st.sidebar.slider("📸 Camera Weight", 0, 100, 25, 5),
+            'battery': st.sidebar.slider("🔋 Battery Weight", 0, 100, 25, 5),
+            'performance': st.sidebar.slider("⚡ Performance Weight", 0, 100, 25, 5),
+            'display': st.sidebar.slider("🖥️ Display Weight", 0, 100, 25, 5),
+        }
+        if sum(custom_weights.values()) == 0:
+            st.sidebar.warning(f"Set at least one weight above zero. Using {get_profile_registry().default} "
+                               "weights for now.")
+            custom_weights = None
     brand_pref = st.sidebar.selectbox("📱 Brand Preference", 
                                      ["Any"] + sorted(df['brand'].unique().tolist()))
     
     st.sidebar.markdown("### Advanced Filters")
     min_camera = st.sidebar.slider("📸 Minimum Camera Score", 0, 100, 0, 5)
     min_battery = st.sidebar.slider("🔋 Minimum Battery Score", 0, 100, 0, 5)
+    value_only = st.sidebar.checkbox("💎 Best value only", value=False,
+                                     help="Hide phones that another phone matches or beats on price and every score")
     
     # Store filters in session state for use in focus_on_selected_phone
     st.session_state['budget'] = budget
     st.session_state['primary_use'] = primary_use
+    st.session_state['custom_weights'] = custom_weights
     st.session_state['brand_pref'] = brand_pref
     st.session_state['min_camera'] = min_camera
     st.session_state['min_battery'] = min_battery
+    st.session_state['value_frontier'] = value_only
     
     # Show recently viewed phones in sidebar
     show_recently_viewed(df)
     
     # Get recommendations
-    recommendations = get_recommendations(df, budget, primary_use, brand_pref, min_camera, min_battery)
+    recommendations = cached_recommendations(df, budget, primary_use, brand_pref, min_camera, min_battery,
+                                             top_k=RECOMMENDATION_LIMIT, weights=custom_weights,
+                                             state=st.session_state.setdefault('candidate_state', {}),
+                                             value_frontier=value_only)
+    match_count = recommendations.attrs['match_count']
+    top_phones = recommendations.head(5)
+    combined_radar = st.sidebar.checkbox("🕸️ Show radar charts in one figure", value=False)
+    radar_figures, radar_render = build_radar_charts(top_phones, combined=combined_radar)
+    show_engine_stats(radar_render)
     
     # Main content
     col1, col2, col3, col4 = st.columns(4)
@@ -1078,7 +3379,7 @@ def main():
         <div class="metric-card">
             <h3 style="color: #00f5ff; margin: 0;">📊</h3>
             <p style="color: white; margin: 0;">Found</p>
-            <p style="color: #00ff88; font-size: 1.2rem; margin: 0;">{len(recommendations)} phones</p>
+            <p style="color: #00ff88; font-size: 1.2rem; margin: 0;">{match_count} phones</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -1099,42 +3400,14 @@ def main():
     # Display recommendations
     st.markdown("## 🏆 Recommended Phones")
     
-    for idx, (_, phone) in enumerate(recommendations.head(5).iterrows()):
-        explanations = generate_explanation(phone, primary_use, budget)
+    if combined_radar:
+        st.plotly_chart(radar_figures[0], use_container_width=True)
+    card_explanations = build_explanations(top_phones, primary_use, budget)
+    for idx, (_, phone) in enumerate(format_spec_columns(top_phones).iterrows()):
+        explanations = card_explanations[idx]
         # Add to recently viewed
         add_recently_viewed(phone['name'])
-        # Create radar chart for phone specs
-        categories = ['Camera', 'Battery', 'Performance', 'Display']
-        values = [phone['camera'], phone['battery'], phone['performance'], phone['display']]
-        fig = go.Figure()
-        fig.add_trace(go.Scatterpolar(
-            r=values,
-            theta=categories,
-            fill='toself',
-            name=phone['name'],
-            line=dict(color='#00f5ff', width=2),
-            fillcolor='rgba(0, 245, 255, 0.2)'
-        ))
-        fig.update_layout(
-            polar=dict(
-                radialaxis=dict(
-                    visible=True,
-                    range=[0, 100],
-                    gridcolor='rgba(255, 255, 255, 0.2)',
-                    color='white'
-                ),
-                angularaxis=dict(
-                    gridcolor='rgba(255, 255, 255, 0.2)',
-                    color='white'
-                )
-            ),
-            showlegend=False,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white', size=12),
-            height=300
-        )
-        col1, col2 = st.columns([2, 1])
+        col1, col2 = (st.container(), None) if combined_radar else st.columns([2, 1])
         with col1:
             rank_badge = "🥇" if idx == 0 else "🥈" if idx == 1 else "🥉" if idx == 2 else f"#{idx+1}"
             st.markdown(f"""
@@ -1176,98 +3449,20 @@ def main():
                 </div>
             </div>
             """, unsafe_allow_html=True)
-        with col2:
-            st.plotly_chart(fig, use_container_width=True)
+        if not combined_radar:
+            with col2:
+                st.plotly_chart(radar_figures[idx], use_container_width=True)
     
-    # --- New Feature: Compare Two Devices by Name ---
-    st.markdown("## 🤝 Compare Any Two Devices")
-    st.info("Enter the names of any two devices from the database to compare them side by side.")
-    colA, colB = st.columns(2)
-    with colA:
-        device1 = st.text_input("Device 1 Name", "iPhone 15 Pro Max")
-    with colB:
-        device2 = st.text_input("Device 2 Name", "Samsung Galaxy S24 Ultra")
-    compare_btn = st.button("Compare Devices")
-    if compare_btn:
-        df1 = df[df['name'].str.lower() == device1.strip().lower()]
-        df2 = df[df['name'].str.lower() == device2.strip().lower()]
-        if df1.empty or df2.empty:
-            st.error("One or both device names not found. Please check spelling or try another device.")
-        else:
-            compare_df = pd.concat([df1, df2])
-            st.markdown("### 📊 Device Comparison Table")
-            st.dataframe(compare_df[['name','price','camera','battery','performance','display','storage','ram','screen_size','os']], use_container_width=True, hide_index=True)
-            # Visual comparison
-            st.markdown("### 📈 Visual Comparison")
-            fig = go.Figure()
-            for _, row in compare_df.iterrows():
-                fig.add_trace(go.Bar(
-                    x=['Camera','Battery','Performance','Display'],
-                    y=[row['camera'], row['battery'], row['performance'], row['display']],
-                    name=row['name']
-                ))
-            fig.update_layout(
-                barmode='group',
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white'),
-                title_font=dict(color='#00f5ff', size=16),
-                title="Specs Comparison"
-            )
-            st.plotly_chart(fig, use_container_width=True)
-    
-    # Add filter summary
-    add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery)
-    # Add comparison section
+    # Page sections; the fragments rerun on their own when only their widgets change
+    add_device_comparison(df)
+    add_filter_summary(budget, primary_use, brand_pref, min_camera, min_battery, value_only)
     add_comparison_section(recommendations)
-    # Add search functionality
     add_search_functionality(df)
-    # Export functionality
-    export_recommendations(recommendations)
-    # Add feedback section
-    st.markdown("## 💬 Feedback")
-    col1, col2 = st.columns(2)
-    with col1:
-        rating = st.select_slider(
-            "How helpful were these recommendations?",
-            options=['😞 Not helpful', '😐 Somewhat helpful', '😊 Very helpful', '🤩 Extremely helpful'],
-            value='😊 Very helpful'
-        )
-    with col2:
-        feedback = st.text_area("Any additional feedback or suggestions?", height=100)
-        if st.button("Submit Feedback"):
-            st.success("Thank you for your feedback! It helps us improve our recommendations.")
-    # Analytics section
-    st.markdown("## 📊 Market Analysis")
-    col1, col2 = st.columns(2)
-    with col1:
-        fig_scatter = px.scatter(
-            df, x='price', y='performance', 
-            color='brand', size='camera',
-            hover_data=['name', 'battery', 'display'],
-            title="Price vs Performance Analysis"
-        )
-        fig_scatter.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white'),
-            title_font=dict(color='#00f5ff', size=16)
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
-    with col2:
-        brand_counts = df['brand'].value_counts()
-        fig_pie = px.pie(
-            values=brand_counts.values, 
-            names=brand_counts.index,
-            title="Brand Distribution"
-        )
-        fig_pie.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white'),
-            title_font=dict(color='#00f5ff', size=16)
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+    add_feature_search(df, budget, primary_use, brand_pref, min_camera, min_battery, custom_weights)
+    export_recommendations(df, recommendations, budget, primary_use, brand_pref, min_camera, min_battery,
+                           custom_weights, value_only)
+    add_feedback_section(recommendations)
+    add_market_analysis(df)
     # Footer
     st.markdown("---")
     st.markdown("""
@@ -1277,5 +3472,270 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
+# Offline scoring CLI
+_worker_catalog = None
+
+def _init_scoring_worker(catalog_path):
+    global _worker_catalog
+    _worker_catalog = load_phone_data(catalog_path)
+
+def _score_profile_chunk(chunk, top_k):
+    return get_recommendations_batch(_worker_catalog, chunk, top_k=top_k)
+
+def iter_profile_chunks(path, chunk_size):
+    """Stream a CSV or Parquet file of user profiles as DataFrame chunks"""
+    if os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+class RecommendationWriter:
+    """Append recommendation chunks to a Parquet or CSV file as they arrive"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS
+        self._writer = None
+        self._header = True
+
+    def write(self, frame):
+        if self.parquet:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self.parquet:
+            # No input rows: still leave a valid, empty result file
+            empty = get_recommendations_batch(load_phone_data(), pd.DataFrame({'budget': []}))
+            pq.write_table(pa.Table.from_pandas(empty, preserve_index=False), self.path)
+
+def score_profiles(profiles_path, output_path, catalog_path=None, top_k=5, workers=None, chunk_size=100_000):
+    """Score a large file of user profiles without Streamlit.
+
+    Profile chunks are streamed from disk, scored in a process pool and
+    written out in input order as they finish. At most two chunks per worker
+    are in flight, so memory stays flat however large the input is. Each
+    worker maps the same Arrow IPC catalog, so catalog pages are shared.
+    Parquet catalogs are converted to a temporary Arrow file first.
+    Returns the number of profiles scored.
+    """
+    workers = workers or os.cpu_count() or 1
+    temporary_catalog = None
+    if catalog_path and os.path.splitext(catalog_path)[1].lower() not in ARROW_EXTENSIONS:
+        temporary_catalog = convert_catalog_to_arrow(catalog_path, f"{output_path}.catalog.arrow")
+        catalog_path = temporary_catalog
+
+    writer = RecommendationWriter(output_path)
+    started = time.perf_counter()
+    scored = 0
+    pending = deque()
+
+    def finish_oldest():
+        nonlocal scored
+        rows, future = pending.popleft()
+        writer.write(future.result())
+        scored += rows
+        elapsed = time.perf_counter() - started
+        print(f"\r{scored:,} profiles scored ({scored / elapsed:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker,
+                                 initargs=(catalog_path,)) as pool:
+            offset = 0
+            for chunk in iter_profile_chunks(profiles_path, chunk_size):
+                if 'query_id' not in chunk:
+                    chunk = chunk.assign(query_id=np.arange(offset, offset + len(chunk)))
+                offset += len(chunk)
+                pending.append((len(chunk), pool.submit(_score_profile_chunk, chunk, top_k)))
+                if len(pending) >= 2 * workers:
+                    finish_oldest()
+            while pending:
+                finish_oldest()
+    finally:
+        writer.close()
+        if temporary_catalog:
+            os.remove(temporary_catalog)
+
+    elapsed = time.perf_counter() - started
+    print(f"\nDone: {scored:,} profiles in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):,.0f} rows/s) -> {output_path}",
+          file=sys.stderr)
+    return scored
+
+# Offline weight tuning
+FEEDBACK_TOP_PHONES = 5        # recommendations per feedback row that the rating is attributed to
+WEIGHT_PRIOR_STRENGTH = 1_000  # feedback rows at which fitted and hand-set weights count equally
+WEIGHT_RIDGE = 1e-3
+SQLITE_EXTENSIONS = ('.sqlite3', '.sqlite', '.db')
+
+def iter_feedback_chunks(path, chunk_size):
+    """Stream stored feedback (the SQLite store, or a CSV/Parquet export of it) as DataFrame chunks"""
+    if os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            yield from pd.read_sql_query("SELECT primary_use, rating, phones FROM feedback", connection,
+                                         chunksize=chunk_size)
+        finally:
+            connection.close()
+    else:
+        yield from iter_profile_chunks(path, chunk_size)
+
+class FeedbackMoments:
+    """Per-profile sufficient statistics for regressing ratings on the rated phones' scores.
+
+    Each feedback row contributes the mean spec scores of its first
+    FEEDBACK_TOP_PHONES recommendations (x) and its rating scaled to 0-1
+    (y). Only Z'Z and Z'y with Z = [1, x] are kept per profile, so chunks can
+    be folded in one at a time and memory does not grow with the input.
+    """
+
+    def __init__(self, df, profiles=None):
+        self.profiles = list(profiles or get_profile_registry().names())
+        # Phone id -> row; the first row wins if the index repeats a label
+        unique = ~df.index.duplicated()
+        self.ids, self.id_rows = df.index[unique], np.flatnonzero(unique)
+        self.specs = df[SCORE_COLUMNS].to_numpy(dtype=np.float64) / 100
+        width = len(SCORE_COLUMNS) + 1
+        self.gram = np.zeros((len(self.profiles), width, width))
+        self.moment = np.zeros((len(self.profiles), width))
+        self.counts = np.zeros(len(self.profiles), dtype=np.int64)
+        self.skipped = 0
+
+    def add(self, chunk):
+        """Fold a chunk with primary_use, rating and phones (JSON list of phone ids) columns into the sums"""
+        size = len(chunk)
+        profile = pd.Index(self.profiles).get_indexer(chunk['primary_use'])
+        rating = pd.to_numeric(chunk['rating'], errors='coerce').to_numpy(dtype=np.float64)
+        phones = chunk['phones'].to_numpy(dtype=object)
+        if size and isinstance(phones[0], str):
+            # One json.loads over the whole chunk is far cheaper than one per row
+            phones = json.loads('[' + ','.join(value if isinstance(value, str) else '[]' for value in phones) + ']')
+        lengths = np.fromiter(map(len, phones), dtype=np.int64, count=size)
+        owner = np.repeat(np.arange(size), lengths)
+        rank = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        ids = np.fromiter(chain.from_iterable(phones), dtype=object, count=len(owner))
+        rows = self.ids.get_indexer(ids)
+        rows = np.where(rows >= 0, self.id_rows[rows], -1)
+        keep = (rows >= 0) & (rank < FEEDBACK_TOP_PHONES)
+        owner, rows = owner[keep], rows[keep]
+        shown = np.bincount(owner, minlength=size)
+        valid = (profile >= 0) & (shown > 0) & ~np.isnan(rating)
+        features = np.column_stack([np.bincount(owner, weights=self.specs[rows, j], minlength=size)
+                                    for j in range(len(SCORE_COLUMNS))])
+        z = np.column_stack([np.ones(int(valid.sum())), features[valid] / shown[valid, None]])
+        y = rating[valid] / (len(FEEDBACK_RATINGS) - 1)
+        profile = profile[valid]
+        np.add.at(self.gram, profile, z[:, :, None] * z[:, None, :])
+        np.add.at(self.moment, profile, z * y[:, None])
+        self.counts += np.bincount(profile, minlength=len(self.profiles))
+        self.skipped += size - int(valid.sum())
+
+    def fit(self, strength=WEIGHT_PRIOR_STRENGTH, ridge=WEIGHT_RIDGE):
+        """Return {profile: {'weights': {column: weight}, 'samples': rows}}.
+
+        The ridge solution is clipped to non-negative weights, normalized, and
+        blended with the profile's current weights by sample count, so sparse
+        profiles stay close to their configured weights.
+        """
+        registry = get_profile_registry()
+        fitted = {}
+        for i, profile in enumerate(self.profiles):
+            samples = int(self.counts[i])
+            weights = prior_weights = registry.get(profile).weights
+            if samples > len(SCORE_COLUMNS):
+                penalty = ridge * samples * np.eye(len(SCORE_COLUMNS) + 1)
+                penalty[0, 0] = 0  # leave the intercept unpenalized
+                coefficients = np.clip(np.linalg.solve(self.gram[i] + penalty, self.moment[i])[1:], 0, None)
+                if coefficients.sum() > 0:
+                    share = samples / (samples + strength)
+                    weights = share * coefficients / coefficients.sum() + (1 - share) * prior_weights
+            fitted[profile] = {
+                'weights': {column: round(float(weight), 6) for column, weight in zip(SCORE_COLUMNS, weights)
+                            if weight > 0},
+                'samples': samples,
+            }
+        return fitted
+
+def tune_weights(feedback_path, output_path, catalog_path=None, chunk_size=500_000,
+                 prior_strength=WEIGHT_PRIOR_STRENGTH):
+    """Fit per-profile weights from stored feedback and write a versioned weights file.
+
+    Feedback is streamed in chunks into FeedbackMoments, so tens of millions
+    of rows need no more memory than one chunk. Phone ids are looked up in
+    the current catalog; ids it no longer has are ignored. The file is
+    replaced atomically and is picked up at startup through $PHONEHUB_WEIGHTS.
+    Returns the written payload.
+    """
+    df = load_phone_data(catalog_path)
+    moments = FeedbackMoments(df)
+    started = time.perf_counter()
+    read = 0
+    for chunk in iter_feedback_chunks(feedback_path, chunk_size):
+        moments.add(chunk)
+        read += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"\r{read:,} feedback rows read ({read / elapsed:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+    profiles = moments.fit(strength=prior_strength)
+    created = datetime.now(timezone.utc)
+    digest = hashlib.sha1(json.dumps(profiles, sort_keys=True).encode()).hexdigest()[:12]
+    payload = {
+        'format': WEIGHTS_FORMAT_VERSION,
+        'version': f"{created:%Y%m%dT%H%M%SZ}-{digest}",
+        'created_at': created.isoformat(),
+        'catalog_version': df.attrs.get('catalog_version'),
+        'rows': read,
+        'skipped': moments.skipped,
+        'profiles': profiles,
+    }
+    with open(f"{output_path}.tmp", 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(f"{output_path}.tmp", output_path)
+    print(f"\nDone: {read:,} rows ({moments.skipped:,} skipped) -> {output_path} version {payload['version']}",
+          file=sys.stderr)
+    return payload
+
+def run_cli(argv=None):
+    """Command-line entry point for headless use"""
+    parser = argparse.ArgumentParser(prog="phone_comparision.py",
+                                     description="PhoneHub offline tools (run the web app with `streamlit run`).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score = commands.add_parser('score', help="Recommend phones for a CSV/Parquet file of user profiles")
+    score.add_argument('profiles', help="Input with budget, primary_use, brand_pref, min_camera, min_battery columns")
+    score.add_argument('output', help="Output .csv or .parquet file of (query_id, rank, phone_id, score) rows")
+    score.add_argument('--catalog', default=os.environ.get(CATALOG_ENV_VAR),
+                       help="Parquet/Arrow catalog (defaults to $PHONEHUB_CATALOG, then the built-in list)")
+    score.add_argument('--top-k', type=int, default=5)
+    score.add_argument('--workers', type=int, default=None)
+    score.add_argument('--chunk-size', type=int, default=100_000)
+
+    tune = commands.add_parser('tune-weights', help="Fit the scoring profile weights from stored feedback")
+    tune.add_argument('output', help="Weights .json file to write (load it with $PHONEHUB_WEIGHTS)")
+    tune.add_argument('--feedback',
+                      help="Feedback SQLite store, or a CSV/Parquet export of it (defaults to the app's store)")
+    tune.add_argument('--catalog', default=os.environ.get(CATALOG_ENV_VAR),
+                      help="Parquet/Arrow catalog (defaults to $PHONEHUB_CATALOG, then the built-in list)")
+    tune.add_argument('--chunk-size', type=int, default=500_000)
+    tune.add_argument('--prior-strength', type=float, default=WEIGHT_PRIOR_STRENGTH,
+                      help="Feedback rows at which fitted and hand-set weights count equally")
+
+    args = parser.parse_args(argv)
+    if args.command == 'score':
+        score_profiles(args.profiles, args.output, args.catalog, args.top_k, args.workers, args.chunk_size)
+    elif args.command == 'tune-weights':
+        tune_weights(args.feedback or feedback_db_path(), args.output, args.catalog, args.chunk_size, args.prior_strength)
+    return 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if st.runtime.exists():
+        main()
+    else:
+        sys.exit(run_cli())
\ No newline at end of file
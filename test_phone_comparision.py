@@ -0,0 +1,910 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet as pq
+import pytest
+
+import phone_comparision as pc
+
+
+def make_catalog(count=300, seed=0, fractional_prices=False, max_price=1500, score_low=50):
+    """Random raw catalog with the required columns"""
+    rng = np.random.default_rng(seed)
+    prices = rng.integers(200, max_price, count).astype(float)
+    if fractional_prices:
+        prices += rng.choice([0.0, 0.25, 0.5, 0.99], count)
+    return pd.DataFrame({
+        'name': [f"Phone {i}" for i in range(count)],
+        'price': prices,
+        'camera': rng.integers(score_low, 100, count),
+        'battery': rng.integers(score_low, 100, count),
+        'performance': rng.integers(score_low, 100, count),
+        'display': rng.integers(score_low, 100, count),
+        'brand': rng.choice(['Apple', 'Samsung', 'Google'], count),
+    })
+
+
+def test_load_catalog_from_parquet_and_arrow(tmp_path):
+    catalog = make_catalog(100)
+    parquet_path = str(tmp_path / 'catalog.parquet')
+    catalog.to_parquet(parquet_path, index=False)
+    arrow_path = pc.convert_catalog_to_arrow(parquet_path, str(tmp_path / 'catalog.arrow'))
+
+    from_parquet, from_arrow = pc.load_phone_data(parquet_path), pc.load_phone_data(arrow_path)
+    pd.testing.assert_frame_equal(from_arrow, from_parquet)
+    assert from_parquet['name'].tolist() == catalog['name'].tolist()
+    np.testing.assert_array_equal(from_parquet['price'].to_numpy(), catalog['price'].to_numpy())
+    assert from_parquet['features'].map(list).tolist() == [[]] * 100
+
+
+def test_load_catalog_rejects_bad_files(tmp_path):
+    path = str(tmp_path / 'catalog.parquet')
+    make_catalog(10).drop(columns=['brand']).to_parquet(path, index=False)
+    with pytest.raises(ValueError, match="brand"):
+        pc.read_catalog_table(path)
+    with pytest.raises(ValueError, match="Unsupported"):
+        pc.read_catalog_table(str(tmp_path / 'catalog.csv'))
+
+
+def ingested(raw):
+    """Ingest a raw catalog the way the loaders do, with the optional columns at their defaults"""
+    raw = raw.copy()
+    for column, default in pc.OPTIONAL_CATALOG_COLUMNS.items():
+        if column not in raw:
+            raw[column] = [list(default) for _ in range(len(raw))] if isinstance(default, tuple) else default
+    return pc.ingest_catalog(raw)
+
+
+def test_spec_strings_parse_to_numbers():
+    raw = make_catalog(5)
+    raw['storage'] = ["128GB", "1TB", "512 MB", "N/A", "1,024GB"]
+    raw['ram'] = ["8GB", "512MB", "768MB", "12 GB", None]
+    raw['battery_mah'] = ["5,000mAh", "4500mAh", "N/A", "5_000mAh", "1,234,567mAh"]
+    raw['screen_size'] = ['6.7"', '6.1"', "", '5.4"', '6.12"']
+    df = ingested(raw)
+    assert df['storage'].tolist() == [128, 1024, 0.5, 0, 1024]
+    assert df['ram'].tolist() == [8, 0.5, 0.75, 12, 0]
+    assert df['battery_mah'].tolist() == [5000, 4500, 0, 5000, 1234567]
+    np.testing.assert_allclose(df['screen_size'], [6.7, 6.1, 0, 5.4, 6.12], rtol=1e-6)
+    assert df['camera'].dtype == np.int8 and df['brand'].dtype == 'category'
+
+    shown = pc.format_spec_columns(df)
+    assert shown['storage'].tolist() == ["128GB", "1TB", "512MB", "N/A", "1TB"]
+    assert shown['ram'].tolist() == ["8GB", "512MB", "768MB", "12GB", "N/A"]
+    assert shown['battery_mah'].tolist() == ["5000mAh", "4500mAh", "N/A", "5000mAh", "1234567mAh"]
+
+
+def test_converted_catalog_columns_stay_memory_mapped(tmp_path):
+    raw = make_catalog(200)
+    raw['storage'], raw['ram'], raw['battery_mah'] = "256GB", "8GB", "5,000mAh"
+    source = str(tmp_path / 'catalog.parquet')
+    raw.to_parquet(source, index=False)
+    table = pc.read_catalog_table(pc.convert_catalog_to_arrow(source, str(tmp_path / 'catalog.arrow')))
+    df = pc.ingest_catalog(pc.catalog_table_to_frame(table))
+    for column in ['price'] + pc.SCORE_COLUMNS + list(pc.NUMERIC_SPEC_COLUMNS):
+        mapped = table.column(column).chunk(0).buffers()[1].address
+        assert df[column].to_numpy().__array_interface__['data'][0] == mapped, column
+
+
+def ranked(rows, scores):
+    """rows by descending score, ties by row: the order every recommendation path must give"""
+    return rows[np.lexsort((rows, -scores[rows]))]
+
+
+def test_catalog_version_names_the_loaded_file(tmp_path):
+    parquet_path = str(tmp_path / 'catalog.parquet')
+    make_catalog(10).to_parquet(parquet_path, index=False)
+    arrow_path = pc.convert_catalog_to_arrow(parquet_path, str(tmp_path / 'catalog.arrow'))
+    versions = [pc.load_phone_data(path).attrs['catalog_version'] for path in (parquet_path, arrow_path)]
+    assert versions[0].startswith(parquet_path) and versions[1].startswith(arrow_path)
+    assert pc.load_phone_data().attrs['catalog_version'] == "builtin"
+
+
+def test_top_k_matches_full_sort_with_ties():
+    df = ingested(make_catalog(3000, seed=3, score_low=95))
+    index = pc.get_catalog_index(df)
+    prices = df['price'].to_numpy()
+    for profile in ["General Use", "Gaming", "Photography"]:
+        scores = index.profile_scores(profile)
+        for budget in (250, 800, 1500):
+            expected = ranked(np.flatnonzero(prices <= budget), scores)
+            for k in (1, 7, 50, None):
+                result = pc.get_recommendations(df, budget, profile, top_k=k)
+                np.testing.assert_array_equal(df.index.get_indexer(result.index), expected[:k])
+                np.testing.assert_array_equal(result['score'], np.round(scores[expected[:k]].astype(np.float64), 4))
+                assert result.attrs['match_count'] == len(expected)
+
+
+def test_recommendation_scores_are_rounded_float64():
+    df = pc.load_phone_data()
+    scores = pc.get_recommendations(df, 1500, "Gaming", top_k=5)['score']
+    assert scores.dtype == np.float64
+    assert (scores == scores.round(pc.SCORE_DECIMALS)).all()
+
+
+def test_index_lookups_match_a_scan():
+    rng = np.random.default_rng(4)
+    raw = make_catalog(5000, seed=4)
+    raw['ram'] = rng.choice(["4GB", "8GB", "12GB", "N/A"], len(raw))
+    df = ingested(raw)
+    index = pc.get_catalog_index(df)
+    columns = {column: df[column].to_numpy() for column in ['price', 'camera', 'battery', 'ram']}
+    brands = df['brand'].astype(str).to_numpy()
+    for budget in (150, 450.5, 1499, np.inf):
+        for brand in (None, "Any", "Apple", "Nokia"):
+            for min_camera, min_battery, min_ram in ((0, 0, 0), (80, 0, 0), (0, 97.5, 8), (99, 60, 0)):
+                mask = (columns['price'] <= budget) & (columns['camera'] >= min_camera)
+                mask &= (columns['battery'] >= min_battery) & (columns['ram'] >= min_ram)
+                if brand not in (None, "Any"):
+                    mask &= brands == brand
+                rows = index.candidate_rows(budget, brand, {'camera': min_camera, 'battery': min_battery},
+                                            {'ram': min_ram})
+                np.testing.assert_array_equal(np.sort(rows), np.flatnonzero(mask))
+
+
+def test_budget_staircase_matches_full_sort_with_ties():
+    df = ingested(make_catalog(4000, seed=5, score_low=95))
+    index = pc.get_catalog_index(df)
+    prices = df['price'].to_numpy()
+    brands = df['brand'].astype(str).to_numpy()
+    budgets = np.concatenate([[0, 199, 2000], np.sort(np.unique(prices))[::97]])
+    for profile in ["General Use", "Battery Life"]:
+        scores = index.profile_scores(profile)
+        for brand in ("Any", "Samsung"):
+            for budget in budgets:
+                candidates = np.flatnonzero((prices <= budget) & ((brands == brand) | (brand == "Any")))
+                expected = ranked(candidates, scores)
+                for k in (1, 10, pc.STAIRCASE_DEPTH):
+                    result = pc.get_recommendations(df, budget, profile, brand, top_k=k)
+                    np.testing.assert_array_equal(df.index.get_indexer(result.index), expected[:k])
+                    assert result.attrs['match_count'] == len(candidates)
+
+        # A shallow staircase takes many snapshots, so budgets land between checkpoints
+        rows, sorted_prices = index.price_index
+        staircase = pc.BudgetStaircase(rows, sorted_prices, scores, 3)
+        for budget in budgets:
+            top_rows, top_scores = staircase.top_k(budget, 3)
+            np.testing.assert_array_equal(top_rows, ranked(np.flatnonzero(prices <= budget), scores)[:3])
+            np.testing.assert_array_equal(top_scores, scores[top_rows])
+
+
+@pytest.mark.parametrize('direct_limit', [0, pc.DIRECT_SCORING_LIMIT])
+def test_custom_weights_match_brute_force(monkeypatch, direct_limit):
+    # A zero limit sends every query down the threshold-algorithm path
+    monkeypatch.setattr(pc, 'DIRECT_SCORING_LIMIT', direct_limit)
+    df = ingested(make_catalog(6000, seed=6, score_low=90))
+    index = pc.get_catalog_index(df)
+    prices, cameras = df['price'].to_numpy(), df['camera'].to_numpy()
+    for weights in ({'camera': 1}, {'camera': 2, 'battery': 1}, {'performance': 1, 'display': 1, 'battery': 3},
+                    {'camera': 1, 'battery': 1, 'performance': 1, 'display': 1}):
+        scores = index.weighted_scores(np.arange(len(df)), pc.normalize_weights(weights))
+        for budget, min_camera in ((1500, 0), (700, 0), (1500, 95)):
+            expected = ranked(np.flatnonzero((prices <= budget) & (cameras >= min_camera)), scores)
+            for k in (1, 10, 300):
+                result = pc.get_recommendations(df, budget, pc.CUSTOM_PROFILE, min_camera=min_camera,
+                                                top_k=k, weights=weights)
+                np.testing.assert_array_equal(df.index.get_indexer(result.index), expected[:k])
+                assert result.attrs['match_count'] == len(expected)
+
+
+def test_batch_matches_single_queries():
+    df = ingested(make_catalog(3000, seed=7, score_low=80))
+    queries = pd.DataFrame({
+        'query_id': np.arange(9) + 100,
+        'budget': [500, 900, 900, 1500, 650.5, 1200, 1200, 800, 400],
+        'primary_use': ["Gaming", "Gaming", "Photography", "Unknown", "Battery Life", "Gaming", "Gaming", None, "Gaming"],
+        'brand_pref': ["Any", "Apple", None, "Samsung", "Any", "Any", "Any", "Google", "Any"],
+        'min_camera': [0, 0, 90, 0, 85.5, 0.2, 0.2, 0, 98.5],
+        'min_battery': [0, 0, 0, 0, 0, 90.01, 90.01, 0, 0],
+    })
+    result = pc.get_recommendations_batch(df, queries, top_k=5)
+    assert result['score'].dtype == np.float64
+    for query in queries.itertuples():
+        primary_use = query.primary_use if query.primary_use in pc.PROFILE_WEIGHTS else "General Use"
+        brand_pref = query.brand_pref if isinstance(query.brand_pref, str) else None
+        expected = pc.get_recommendations(df, query.budget, primary_use, brand_pref, query.min_camera,
+                                          query.min_battery, top_k=5)
+        answer = result[result['query_id'] == query.query_id]
+        assert answer['rank'].tolist() == list(range(1, len(expected) + 1))
+        assert answer['phone_id'].tolist() == expected.index.tolist()
+        np.testing.assert_array_equal(answer['score'], expected['score'])
+
+
+def test_batch_scores_are_rounded_float64():
+    batch = pc.get_recommendations_batch(pc.load_phone_data(), pd.DataFrame({'budget': [800, 1200]}))
+    assert (batch['score'] == batch['score'].round(pc.SCORE_DECIMALS)).all()
+    assert "93.300003" not in batch.to_csv(index=False)
+
+
+def test_batch_missing_budget_means_no_limit():
+    df = pc.load_phone_data()
+    queries = pd.DataFrame({'query_id': [1, 2, 3], 'budget': [800, np.nan, None],
+                            'primary_use': ["Gaming", "Gaming", "Photography"]})
+    result = pc.get_recommendations_batch(df, queries, top_k=3)
+    unlimited = pc.get_recommendations_batch(df, queries.assign(budget=[800, np.inf, np.inf]), top_k=3)
+    pd.testing.assert_frame_equal(result, unlimited)
+    assert result.groupby('query_id').size().to_dict() == {1: 3, 2: 3, 3: 3}
+
+
+@pytest.mark.parametrize('output_name', ['scores.parquet', 'scores.csv'])
+def test_score_cli_matches_batch(tmp_path, output_name):
+    catalog_path = str(tmp_path / 'catalog.parquet')
+    make_catalog(500, seed=8).to_parquet(catalog_path, index=False)
+    rng = np.random.default_rng(8)
+    profiles = pd.DataFrame({
+        'budget': rng.integers(300, 1500, 50),
+        'primary_use': rng.choice(["Gaming", "Photography", "General Use"], 50),
+        'brand_pref': rng.choice(["Any", "Apple"], 50),
+        'min_camera': rng.choice([0, 70], 50),
+    })
+    profiles_path = str(tmp_path / 'profiles.csv')
+    profiles.to_csv(profiles_path, index=False)
+    output_path = str(tmp_path / output_name)
+
+    assert pc.run_cli(['score', profiles_path, output_path, '--catalog', catalog_path, '--top-k', '3',
+                       '--workers', '2', '--chunk-size', '7']) == 0
+    result = pd.read_parquet(output_path) if output_name.endswith('.parquet') else pd.read_csv(output_path)
+    expected = pc.get_recommendations_batch(pc.load_phone_data(catalog_path),
+                                            profiles.assign(query_id=np.arange(50)), top_k=3)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert not (tmp_path / f'{output_name}.catalog.arrow').exists()
+
+
+def test_score_cli_with_no_profiles(tmp_path):
+    profiles_path = str(tmp_path / 'profiles.csv')
+    pd.DataFrame({'budget': []}).to_csv(profiles_path, index=False)
+    output_path = str(tmp_path / 'scores.parquet')
+    assert pc.score_profiles(profiles_path, output_path, workers=1) == 0
+    assert pd.read_parquet(output_path).columns.tolist() == ['query_id', 'rank', 'phone_id', 'score']
+
+
+def test_lru_cache_counts_and_evicts_least_recent():
+    cache = pc.LRUCache(2)
+    assert cache.get('a') is None
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)   # 'b' is the least recently used
+    assert cache.get('b', 'gone') == 'gone'
+    assert cache.get_or_compute('c', lambda: pytest.fail("c is cached")) == 3
+    assert cache.get_or_compute('d', lambda: 4) == 4
+    assert cache.stats() == {'entries': 2, 'max_entries': 2, 'hits': 2, 'misses': 3, 'evictions': 2,
+                             'hit_rate': 0.4}
+
+
+def test_cached_recommendations_share_equivalent_requests(monkeypatch):
+    cache = pc.LRUCache(16)
+    monkeypatch.setattr(pc, 'get_recommendation_cache', lambda: cache)
+    df = pc.load_phone_data()
+    first = pc.cached_recommendations(df, 900, "Gaming", None, top_k=5)
+    assert pc.cached_recommendations(df, 900.0, "Gaming", "Any", top_k=5) is first
+    custom = pc.cached_recommendations(df, 900, pc.CUSTOM_PROFILE, top_k=5, weights={'camera': 1, 'battery': 1})
+    assert pc.cached_recommendations(df, 900, pc.CUSTOM_PROFILE, top_k=5, weights={'camera': 3, 'battery': 3}) is custom
+    pd.testing.assert_frame_equal(first, pc.get_recommendations(df, 900, "Gaming", top_k=5))
+    assert cache.stats()['hits'] == 2 and cache.stats()['entries'] == 2
+
+    # Frames without a catalog version are never cached
+    unversioned = df.iloc[:20].copy()
+    unversioned.attrs = {}
+    assert len(pc.cached_recommendations(unversioned, 900, "Gaming", top_k=5)) == 5
+    assert cache.stats()['entries'] == 2 and cache.stats()['misses'] == 2
+
+
+def test_incremental_matches_get_recommendations(monkeypatch):
+    monkeypatch.setattr(pc, 'DIRECT_SCORING_LIMIT', 0)
+    raw = make_catalog(20000, seed=10)
+    for column in pc.SCORE_COLUMNS:
+        raw[column] = raw[column] // 10 * 10   # heavy ties
+    df = ingested(raw)
+    df.attrs['catalog_version'] = "incremental-test"
+    rng = np.random.default_rng(10)
+    state = {}
+    for _ in range(60):
+        # Mostly tightening steps, so the narrowed path runs as often as the full one
+        if rng.random() < 0.3 or 'filters' not in state:
+            budget, min_camera, min_battery = 1500, 0, 0
+        budget -= int(rng.integers(0, 150))
+        min_camera += int(rng.choice([0, 0, 10]))
+        min_battery += int(rng.choice([0, 5]))
+        weights = None if rng.random() < 0.3 else {'camera': 1, 'battery': int(rng.integers(1, 3)), 'display': 1}
+        primary_use = str(rng.choice(["Gaming", "General Use"]))
+        top_k = int(rng.choice([5, 10, 60]))
+        result = pc.incremental_recommendations(df, state, budget, primary_use, None, min_camera, min_battery,
+                                                top_k=top_k, weights=weights)
+        expected = pc.get_recommendations(df, budget, primary_use, None, min_camera, min_battery,
+                                          top_k=top_k, weights=weights)
+        pd.testing.assert_frame_equal(result, expected)
+        assert result.attrs['match_count'] == expected.attrs['match_count']
+
+
+def test_incremental_state_is_compact_and_bounded(monkeypatch):
+    df = ingested(make_catalog(10000, seed=11))
+    df.attrs['catalog_version'] = "incremental-state-test"
+    state = {}
+    pc.incremental_recommendations(df, state, 1500, "Gaming", min_camera=60, top_k=5)
+    kind, packed = state['rows']
+    assert kind == 'bitmap' and packed.nbytes == 10000 // 8
+    pc.incremental_recommendations(df, state, 300, "Gaming", min_camera=98, top_k=5)
+    kind, packed = state['rows']
+    assert kind == 'ids' and packed.dtype == np.int32 and packed.nbytes < 10000 // 8
+
+    monkeypatch.setattr(pc, 'INCREMENTAL_STATE_BYTES', 64)
+    result = pc.incremental_recommendations(df, state, 1500, "Gaming", min_camera=60, top_k=5)
+    assert state == {}
+    pd.testing.assert_frame_equal(result, pc.get_recommendations(df, 1500, "Gaming", min_camera=60, top_k=5))
+
+
+def test_explanations_pick_tiers_per_row():
+    phones = pd.DataFrame({'name': ["A", "B", "C"], 'price': [700, 880, 950], 'camera': [95, 85, 70],
+                           'performance': [50, 50, 50], 'battery': [50, 50, 50],
+                           'features': [["OIS", "5G", "eSIM", "IP68"], [], ["USB-C"]]})
+    assert pc.build_explanations(phones, "Photography", 1000) == [
+        ["📸 Exceptional camera quality (95/100) perfect for photography enthusiasts",
+         "💰 Great value at $700 - well within your $1000 budget",
+         "✨ Key features: OIS, 5G, eSIM"],
+        ["📸 Very good camera (85/100) suitable for most photography needs",
+         "💰 Good value at $880 for the features offered"],
+        ["✨ Key features: USB-C"],
+    ]
+    assert pc.build_explanations(phones, "General Use", 1000)[1] == ["💰 Good value at $880 for the features offered"]
+
+
+def test_explanations_are_memoized_per_phone(monkeypatch):
+    cache = pc.LRUCache(64)
+    monkeypatch.setattr(pc, 'get_explanation_cache', lambda: cache)
+    df = pc.load_phone_data()
+    first = pc.build_explanations(df.iloc[:4], "Gaming", 800)
+    assert cache.stats()['misses'] == 4
+    assert pc.build_explanations(df.iloc[2:6], "Gaming", 800)[:2] == first[2:]
+    assert cache.stats()['hits'] == 2 and cache.stats()['entries'] == 6
+    pc.build_explanations(df.iloc[:4], "Gaming", 900)
+    assert cache.stats()['entries'] == 10
+
+
+def test_radar_figures_are_cached_by_name_and_scores(monkeypatch):
+    cache = pc.LRUCache(16)
+    monkeypatch.setattr(pc, 'get_radar_cache', lambda: cache)
+    phones = pc.load_phone_data().iloc[:3]
+    figures, render = pc.build_radar_charts(phones)
+    assert len(figures) == 3 and render['built'] == 3 and render['payload_bytes'] > 0
+    assert list(figures[0].data[0].r) == phones[pc.SCORE_COLUMNS].iloc[0].tolist()
+
+    again, render = pc.build_radar_charts(phones)
+    assert render['built'] == 0 and all(a is b for a, b in zip(figures, again))
+    changed = phones.assign(camera=phones['camera'] - 1)
+    assert pc.build_radar_charts(changed)[1]['built'] == 3
+
+    grid, render = pc.build_radar_charts(phones, combined=True)
+    assert len(grid) == 1 and len(grid[0].data) == 3 and render['built'] == 1
+    assert pc.build_radar_charts(phones.iloc[:0], combined=True)[0] == []
+
+
+def test_page_sections_rerun_without_errors():
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(pc.__file__, default_timeout=60)
+    app.run()
+    assert not app.exception
+    search = next(widget for widget in app.text_input if "Search" in widget.label)
+    search.input("pixel").run()
+    assert not app.exception
+    assert any("Pixel" in block.value and "phone-card" in block.value for block in app.markdown)
+    next(button for button in app.button if button.label == "Compare Devices").click().run()
+    assert not app.exception
+    app.sidebar.slider[0].set_value(1200).run()
+    assert not app.exception
+
+
+def market_catalog(count, seed):
+    raw = make_catalog(count, seed=seed)
+    raw['category'] = np.random.default_rng(seed).choice(["Flagship", "Mid-range", "Budget"], count)
+    df = ingested(raw)
+    df.attrs['catalog_version'] = f"market-test-{seed}"
+    return df
+
+
+def assert_same_market(actual, expected):
+    for by in pc.MARKET_GROUPS:
+        pd.testing.assert_series_equal(actual.counts(by).sort_index(), expected.counts(by).sort_index())
+        pd.testing.assert_frame_equal(actual.summary(by).sort_index(), expected.summary(by).sort_index(),
+                                      check_exact=False, atol=1e-6)
+
+
+def test_patch_catalog_market_matches_full_recompute():
+    df = market_catalog(400, seed=14)
+    assert pc.get_catalog_index(df).market is not None
+    apple = df.index[df['brand'] == "Apple"]
+    updates = [{'name': name, 'price': 999, 'camera': 90, 'battery': 80, 'performance': 85, 'display': 88,
+                'brand': "Nokia", 'category': "Rugged"} for name in df.loc[apple, 'name']]
+    updates.append({'name': "Brand New", 'price': 450.5, 'camera': 70, 'battery': 95, 'performance': 60,
+                    'display': 75, 'brand': "Google", 'category': "Budget"})
+    patched = pc.patch_catalog(df, updates)
+
+    assert len(patched) == len(df) + 1 and patched['name'].is_unique
+    assert patched.attrs['catalog_version'].startswith(df.attrs['catalog_version'] + "+")
+    incremental = pc.get_catalog_index(patched).market
+    assert "Apple" not in incremental.counts('brand').index
+    assert_same_market(incremental, pc.MarketAggregates.from_frame(patched))
+
+
+def test_market_aggregates_add_and_remove():
+    df = market_catalog(300, seed=15)
+    head, tail = df.iloc[:120], df.iloc[120:]
+    merged = pc.MarketAggregates.from_frame(head).add(tail)
+    assert_same_market(merged, pc.MarketAggregates.from_frame(df))
+    assert_same_market(merged.remove(tail), pc.MarketAggregates.from_frame(head))
+    summary = pc.MarketAggregates.from_frame(df).summary('brand')
+    expected = df.groupby(df['brand'].astype(str), observed=True)['price'].agg(['mean', 'std'])
+    np.testing.assert_allclose(summary['price_mean'], expected['mean'])
+    counts = summary['count'].to_numpy()
+    np.testing.assert_allclose(summary['price_std'], expected['std'] * np.sqrt((counts - 1) / counts))
+
+
+def test_price_performance_view_bins_large_windows(monkeypatch):
+    monkeypatch.setattr(pc, 'SCATTER_POINT_LIMIT', 100)
+    df = ingested(make_catalog(1000, seed=16))
+    prices, performance = df['price'].to_numpy(), df['performance'].to_numpy()
+
+    fig, count = pc.price_performance_view(df, (400, 600), (60, 70))
+    in_view = (prices >= 400) & (prices <= 600) & (performance >= 60) & (performance <= 70)
+    assert count == in_view.sum() <= 100
+    assert fig.data[0].type == 'scattergl' and sorted(fig.data[0].x) == sorted(prices[in_view])
+
+    fig, count = pc.price_performance_view(df, (200, 1500), (0, 100))
+    assert count == 1000 and fig.data[0].type == 'heatmap'
+    assert np.nansum(np.asarray(fig.data[0].z, dtype=float)) == 1000
+
+    figures = pc.build_market_figures(df, pc.MarketAggregates.from_frame(df))
+    assert figures['scatter'].data[0].type == 'heatmap'
+
+
+def brute_force_name_search(names, query, limit=pc.SEARCH_RESULT_LIMIT):
+    names = [pc.normalize_name(name) for name in names]
+    query = pc.normalize_name(query)
+    wanted = {(' ' + query)[i:i + 3] for i in range(len(query) - 1)}
+    total = len(wanted)
+    required = total if total <= 2 else max(2, -(-total // 2))
+    matches = [len(wanted & {(' ' + name + ' ')[i:i + 3] for i in range(len(name))}) for name in names]
+    rows = sorted((row for row in range(len(names)) if matches[row] >= required),
+                  key=lambda row: (-matches[row], len(names[row]), row))[:limit]
+    return rows, [matches[row] / total for row in rows]
+
+
+def random_names(count, seed, alphabet=None):
+    rng = np.random.default_rng(seed)
+    if alphabet is not None:
+        return ["".join(rng.choice(alphabet, rng.integers(3, 8))) for _ in range(count)]
+    brands = ["Samsung Galaxy", "Google Pixel", "iPhone", "OnePlus", "Xiaomi Redmi", "Motorola Edge"]
+    suffixes = ["", " Pro", " Ultra", " Plus", " Lite", " Pro Max", " 5G"]
+    return [f"{rng.choice(brands)} {rng.choice(['S', 'A', 'Note ', ''])}{rng.integers(1, 60)}{rng.choice(suffixes)}"
+            for _ in range(count)]
+
+
+def test_name_search_matches_brute_force():
+    names = random_names(2000, seed=16)
+    index = pc.NameSearchIndex(pd.Series(names))
+    queries = ["galaxy s24 ultra", "Pixle 8 pro", "iphone 15 pro max", "oneplus", "redmi note 13", "xyz", "edge"]
+    queries += [names[row] for row in range(0, 2000, 250)]
+    for query in queries:
+        rows, ratios = index.search(query)
+        expected_rows, expected_ratios = brute_force_name_search(names, query)
+        assert rows.tolist() == expected_rows, query
+        np.testing.assert_allclose(ratios, expected_ratios)
+
+    rows = index.complete("GOOGLE pix", limit=5)
+    expected = sorted((pc.normalize_name(name), row) for row, name in enumerate(names)
+                      if pc.normalize_name(name).startswith("google pix"))[:5]
+    assert rows.tolist() == [row for _, row in expected]
+
+
+def test_name_search_with_a_large_alphabet():
+    # Thousands of distinct characters make the packed trigram keys wider than 32 bits
+    alphabet = np.array([chr(0x4E00 + i) for i in range(3000)])
+    names = random_names(600, seed=17, alphabet=alphabet)
+    index = pc.NameSearchIndex(pd.Series(names))
+    assert index.alphabet_size ** 3 > 2 ** 32
+    for row in range(0, 600, 20):
+        rows, ratios = index.search(names[row])
+        expected_rows, expected_ratios = brute_force_name_search(names, names[row])
+        assert rows.tolist() == expected_rows and ratios[0] == 1
+        assert row in rows[ratios == 1]
+
+
+def test_stable_key_order_sorts_wide_keys():
+    rng = np.random.default_rng(18)
+    for high in (2, 1 << 16, 1 << 40, 1 << 62):
+        keys = rng.integers(0, high, 5000, dtype=np.int64)
+        keys[::7] = keys[0]
+        np.testing.assert_array_equal(pc._stable_key_order(keys), np.argsort(keys, kind='stable'))
+    assert len(pc._stable_key_order(np.zeros(0, dtype=np.int64))) == 0
+
+
+FEATURE_ENTRIES = ["Fast charging", "Wireless charging", "IP68 water resistance", "120Hz display", "Great cameras",
+                   "No headphone jack", "5G", "Stereo speakers", "Long battery life", "Telephoto camera",
+                   "Expandable storage", "Slow charging", "Heavy", "Bright OLED display", "Satellite SOS"]
+
+
+def feature_catalog(count, seed):
+    rng = np.random.default_rng(seed)
+    raw = make_catalog(count, seed=seed)
+    for field, most in (('features', 5), ('pros', 3), ('cons', 2)):
+        raw[field] = [list(rng.choice(FEATURE_ENTRIES, rng.integers(0, most + 1), replace=False))
+                      for _ in range(count)]
+    return ingested(raw)
+
+
+def brute_force_bm25f(df, query, weights=pc.FEATURE_FIELD_WEIGHTS):
+    fields = list(pc.FEATURE_FIELD_WEIGHTS)
+    docs = [[[token for entry in df[field].iloc[row] for token in pc.tokenize(entry)] for field in fields]
+            for row in range(len(df))]
+    lengths = np.array([sum(weights[field] * len(doc[i]) for i, field in enumerate(fields)) for doc in docs])
+    average = max(lengths.mean(), 1e-9)
+    scores, matched = np.zeros(len(df)), np.zeros(len(df), dtype=bool)
+    for token in dict.fromkeys(pc.tokenize(query)):
+        containing = [row for row in range(len(df)) if any(token in field for field in docs[row])]
+        idf = np.log(1 + (len(df) - len(containing) + 0.5) / (len(containing) + 0.5))
+        for row in containing:
+            tf = sum(weights[field] * docs[row][i].count(token) for i, field in enumerate(fields))
+            norm = pc.BM25_K1 * (1 - pc.BM25_B + pc.BM25_B * lengths[row] / average)
+            scores[row] += idf * tf * (pc.BM25_K1 + 1) / (tf + norm)
+            matched[row] = True
+    rows = np.flatnonzero(matched)
+    return rows, scores[rows]
+
+
+def test_feature_search_matches_brute_force_bm25f():
+    df = feature_catalog(400, seed=19)
+    index = pc.FeatureSearchIndex(df)
+    for query in ["charging", "wireless charging", "satellite", "OLED displays", "great camera battery",
+                  "the and with", "nothing matches"]:
+        rows, scores = index.search(query)
+        expected_rows, expected_scores = brute_force_bm25f(df, query)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_feature_recommendations_rank_by_relevance_then_score():
+    df = feature_catalog(400, seed=20)
+    index = pc.get_catalog_index(df)
+    rows, relevance = index.feature_search.search("wireless charging")
+    keep = df['price'].to_numpy()[rows] <= 1000
+    rows, relevance = rows[keep], relevance[keep]
+    scores = index.profile_scores("Gaming")[rows]
+    expected = rows[np.lexsort((rows, -scores, -relevance))]
+    result = pc.get_recommendations(df, 1000, "Gaming", text="wireless charging", top_k=7)
+    np.testing.assert_array_equal(df.index.get_indexer(result.index), expected[:7])
+    assert result.attrs['match_count'] == len(rows)
+    assert (np.diff(result['relevance']) <= 0).all()
+
+
+def test_parse_feature_query():
+    assert pc.parse_feature_query("fast charging under $700 for gaming") == {
+        'text': "fast charging", 'budget': 700.0, 'primary_use': "Gaming"}
+    assert pc.parse_feature_query("good camera $1.2k or less") == {
+        'text': "good camera", 'budget': 1200.0, 'primary_use': None}
+    assert pc.parse_feature_query("long battery life for photos") == {
+        'text': "long battery life", 'budget': None, 'primary_use': "Photography"}
+    assert pc.parse_feature_query("within 1,500 for everyday use") == {
+        'text': "", 'budget': 1500.0, 'primary_use': "General Use"}
+
+
+def test_name_resolver_handles_aliases_and_shorthand():
+    df = pd.DataFrame({
+        'name': ["Samsung Galaxy S24 Ultra", "Samsung Galaxy S24", "Apple iPhone 15 Pro Max", "Apple iPhone 15 Pro",
+                 "Apple iPhone 15", "Google Pixel 8 Pro", "Google Pixel 8"],
+        'aliases': [["Galaxy S24 Ultra 5G"], [], ["iPhone 15 PM"], [], [], ["Pixel 8P"], []],
+    })
+    resolver = pc.get_catalog_index(df).name_resolver
+    assert resolver.resolve("samsung galaxy s24 ultra") == (0, 'exact')
+    assert resolver.resolve("Apple iPhone-15") == (4, 'exact')
+    assert resolver.resolve("galaxy s24 ultra 5g") == (0, 'alias')
+    assert resolver.resolve("S24U") == (0, 'alias')
+    assert resolver.resolve("S24") == (1, 'alias')
+    assert resolver.resolve("15 PM") == (2, 'alias')
+    assert resolver.resolve("iphone 15 pro") == (3, 'alias')
+    assert resolver.resolve("Galaxy S24U") == (0, 'alias')
+    assert resolver.resolve("Pixle 8 Pro") == (5, 'fuzzy')
+    assert resolver.resolve("Pro") == (None, None)
+    assert resolver.resolve("") == (None, None)
+
+
+def test_name_resolver_counts_duplicate_names_once():
+    names = ["Galaxy S24 Ultra", "Galaxy A15", "Galaxy S24 Ultra", "Galaxy S24 Ultra"]
+    resolver = pc.NameResolver(pd.DataFrame({'name': names}))
+    assert resolver.resolve("Galaxy S24 Ultra") == (0, 'exact')
+    assert resolver.resolve("S24U") == (0, 'alias')
+    # A different phone sorted after the duplicates still makes the shorthand ambiguous
+    resolver = pc.NameResolver(pd.DataFrame({'name': names + ["Oz S24 Ultra"]}))
+    assert resolver.resolve("S24U") == (None, None)
+    assert resolver.resolve("oz s24u") == (4, 'alias')
+
+
+def test_comparison_matrix_deltas_and_best_cells():
+    raw = pd.DataFrame({'name': ["Base", "Big", "Small"], 'price': [800, 1000, 650], 'camera': [90, 85, 90],
+                        'battery': [80, 95, 70], 'performance': [88, 92, 60], 'display': [90, 90, 75],
+                        'brand': ["A", "B", "C"], 'storage': ["128GB", "1TB", "N/A"], 'ram': ["8GB", "12GB", "512MB"],
+                        'screen_size': ['6.1"', '6.8"', '5.4"']})
+    phones = ingested(raw).assign(score=[88.5, 91.3, 70.0])
+    matrix = pc.ComparisonMatrix(phones)
+
+    deltas = matrix.delta_table(0).set_index('Phone')
+    assert deltas.loc["Base"].tolist() == ["±$0", "±0", "±0", "±0", "±0", "±0GB", "±0GB", '±0.00"', "±0.0", "0 / 8"]
+    assert deltas.loc["Big"].tolist() == ["+$200", "−5", "+15", "+4", "±0", "+896GB", "+4GB", '+0.70"', "+2.8", "5 / 8"]
+    assert deltas.loc["Small"].tolist() == ["−$150", "±0", "−10", "−28", "−15", "N/A", "−7.5GB", '−0.70"', "−18.5",
+                                            "1 / 8"]
+    np.testing.assert_allclose(matrix.deltas[2, 1], -matrix.deltas[1, 2])
+
+    table = pc.create_comparison_table(phones)
+    assert table['Storage'].tolist() == ["128GB", "1TB", "N/A"] and table['RAM'].tolist() == ["8GB", "12GB", "512MB"]
+    best = matrix.best_cells(table) != ''
+    assert best['Price'].tolist() == [False, False, True]
+    assert best['Camera Score'].tolist() == [True, False, True]
+    assert best['Storage'].tolist() == [False, True, False]
+    assert not best['Screen Size'].any() and not best['Phone'].any()
+
+
+def read_export(payload, export_format):
+    """Decode an export_payload() back into a frame of display strings and numbers"""
+    _, _, writer_kind, compression = pc.EXPORT_FORMATS[export_format]
+    source = pa.BufferReader(payload)
+    if compression:
+        source = pa.CompressedInputStream(source, compression)
+    if writer_kind == 'json':
+        return pd.DataFrame(json.loads(source.read().decode()))
+    if writer_kind == 'csv':
+        table = pa.csv.read_csv(source, convert_options=pa.csv.ConvertOptions(
+            column_types={'storage': pa.string(), 'ram': pa.string()}))
+    elif writer_kind == 'parquet':
+        table = pq.read_table(source)
+    else:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+@pytest.mark.parametrize('export_format', list(pc.EXPORT_FORMATS))
+def test_export_round_trips(export_format):
+    raw = make_catalog(30, seed=21)
+    raw['price'] += np.tile([0, 0.25, 0.5], 10)
+    raw['storage'] = np.tile(["128GB", "1TB", "N/A"], 10)
+    raw['ram'] = np.tile(["8GB", "512MB", "12GB"], 10)
+    frame = ingested(raw).assign(score=np.linspace(60, 90, 30))
+    expected = pc.format_spec_columns(frame[pc.EXPORT_COLUMNS]).astype({'brand': str})
+
+    for chunk_size in (7, pc.EXPORT_CHUNK_SIZE):
+        decoded = read_export(pc.export_payload(frame, export_format, chunk_size), export_format)
+        assert decoded.columns.tolist() == pc.EXPORT_COLUMNS
+        for column in pc.EXPORT_COLUMNS:
+            assert decoded[column].tolist() == expected[column].tolist(), column
+
+    empty = read_export(pc.export_payload(frame.iloc[:0], export_format), export_format)
+    assert len(empty) == 0
+    if pc.EXPORT_FORMATS[export_format][2] != 'json':
+        assert empty.columns.tolist() == pc.EXPORT_COLUMNS
+
+
+def test_feedback_db_path_is_configurable_and_absolute(monkeypatch, tmp_path):
+    monkeypatch.delenv(pc.FEEDBACK_DB_ENV_VAR, raising=False)
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path))
+    assert pc.feedback_db_path() == str(tmp_path / 'phonehub' / pc.FEEDBACK_DB_FILENAME)
+    monkeypatch.setenv(pc.FEEDBACK_DB_ENV_VAR, 'relative.sqlite3')
+    assert pc.feedback_db_path() == str(pc.os.path.abspath('relative.sqlite3'))
+    assert pc.feedback_db_path(str(tmp_path / 'explicit.sqlite3')) == str(tmp_path / 'explicit.sqlite3')
+
+
+def test_feedback_stores_phone_ids(tmp_path):
+    path = str(tmp_path / 'store' / 'feedback.sqlite3')
+    writer = pc.FeedbackWriter(path)
+    assert writer.submit(pc.feedback_record(2, "", {'primary_use': "Gaming"}, [7, 3, 7], "builtin"))
+    writer.close()
+    connection = pc.sqlite3.connect(path)
+    phones, = connection.execute("SELECT phones FROM feedback").fetchone()
+    connection.close()
+    assert pc.json.loads(phones) == [7, 3, 7]
+
+
+def test_feedback_writer_batches_every_submission(tmp_path):
+    path = str(tmp_path / 'feedback.sqlite3')
+    writer = pc.FeedbackWriter(path)
+    for i in range(2000):
+        assert writer.submit(pc.feedback_record(i % 4, f"comment {i}", {'primary_use': "Gaming", 'budget': 800}, [i]))
+    writer.close()
+    stats = writer.stats()
+    assert stats['written'] == 2000 and stats['rejected'] == 0 and stats['batches'] < 2000
+    connection = pc.sqlite3.connect(path)
+    assert connection.execute("SELECT COUNT(*), SUM(rating) FROM feedback").fetchone() == (2000, 3000)
+    connection.close()
+
+
+def test_feedback_writer_reports_an_unusable_path(tmp_path):
+    (tmp_path / 'not-a-directory').write_text("")
+    writer = pc.FeedbackWriter(str(tmp_path / 'not-a-directory' / 'feedback.sqlite3'))
+    writer.close()
+    assert isinstance(writer.error, OSError)
+    assert not writer.submit(pc.feedback_record(1, "", {}, []))
+
+
+def test_tune_weights_with_duplicate_names(tmp_path):
+    catalog = make_catalog(50)
+    catalog['name'] = "Same Phone"
+    catalog_path = str(tmp_path / 'catalog.parquet')
+    catalog.to_parquet(catalog_path, index=False)
+    feedback_path = str(tmp_path / 'feedback.sqlite3')
+    writer = pc.FeedbackWriter(feedback_path)
+    for i in range(40):
+        writer.submit(pc.feedback_record(i % 4, "", {'primary_use': "Gaming"}, [i, i + 1, 99]))
+    writer.close()
+
+    payload = pc.tune_weights(feedback_path, str(tmp_path / 'weights.json'), catalog_path)
+    assert payload['rows'] == 40 and payload['skipped'] == 0
+    assert payload['profiles']["Gaming"]['samples'] == 40
+
+
+def test_tune_weights_recovers_the_rated_score(tmp_path):
+    catalog = make_catalog(400, seed=22)
+    catalog_path = str(tmp_path / 'catalog.parquet')
+    catalog.to_parquet(catalog_path, index=False)
+    rng = np.random.default_rng(22)
+    feedback_path = str(tmp_path / 'feedback.sqlite3')
+    writer = pc.FeedbackWriter(feedback_path)
+    for _ in range(3000):
+        phones = rng.choice(400, 5, replace=False)
+        # Users rate by camera quality alone, whatever the profile claims to weigh
+        rating = int(np.clip(np.round((catalog['camera'].to_numpy()[phones].mean() - 60) / 10), 0, 3))
+        writer.submit(pc.feedback_record(rating, "", {'primary_use': "Gaming"}, phones.tolist()))
+    writer.close()
+
+    weights_path = str(tmp_path / 'weights.json')
+    payload = pc.tune_weights(feedback_path, weights_path, catalog_path, chunk_size=700, prior_strength=0)
+    gaming = payload['profiles']["Gaming"]
+    assert gaming['samples'] == 3000 and gaming['weights']['camera'] > 0.8
+    assert payload['profiles']["Photography"]['samples'] == 0
+
+    tuned, version = pc.load_profile_weights(weights_path, {"Gaming": {'performance': 1.0}, "Other": {'battery': 1.0}})
+    assert version == payload['version']
+    assert tuned == {"Gaming": gaming['weights'], "Other": {'battery': 1.0}}
+
+
+def test_profile_registry_without_general_use(tmp_path):
+    path = tmp_path / 'profiles.json'
+    path.write_text(pc.json.dumps({'default': "Value", 'profiles': {
+        "Value": {'weights': {'camera': 1, 'battery': 1}}, "Gaming": {'weights': {'performance': 1}}}}))
+    registry = pc.ProfileRegistry(str(path))
+    assert registry.names() == ["Value", "Gaming"]
+    assert registry.get("General Use") is registry.profiles["Value"]
+
+    path.write_text(pc.json.dumps({'default': "Photo", 'profiles': {"Photo": {'weights': {'camera': 1}}}}))
+    pc.os.utime(path, ns=(1, 1))
+    registry._checked -= pc.PROFILE_RELOAD_SECONDS
+    assert registry.refresh() == {"Value", "Gaming", "Photo"}
+    default, profiles = registry._state
+    assert default == "Photo" and list(profiles) == ["Photo"]
+    assert registry.get("Value").name == "Photo"
+
+
+def test_expression_profiles_rank_with_terms_and_tie_breakers(tmp_path, monkeypatch):
+    path = tmp_path / 'profiles.json'
+    path.write_text(json.dumps({'default': "Value", 'profiles': {
+        "Value": {'weights': {'camera': 1, 'battery': 1}, 'terms': [{'expression': "-price / 100", 'weight': 2}],
+                  'tie_breakers': ["-battery_mah", "price"]},
+        "Gaming": {'weights': {'performance': 1}}}}))
+    registry = pc.ProfileRegistry(str(path))
+    monkeypatch.setattr(pc, 'get_profile_registry', lambda: registry)
+    raw = make_catalog(800, seed=23, score_low=97)
+    raw['price'] = raw['price'] // 100 * 100
+    raw['battery_mah'] = np.random.default_rng(23).choice(["4000mAh", "5000mAh"], len(raw))
+    df = ingested(raw)
+    index = pc.get_catalog_index(df)
+
+    scores, ranks = registry.get("Value").evaluate(index.columns)
+    columns = {column: df[column].to_numpy(dtype=np.float64) for column in ['camera', 'battery', 'price']}
+    expected = ((columns['camera'] + columns['battery']) / 2).astype(np.float32) - np.float32(2) * (
+        columns['price'] / 100).astype(np.float32)
+    np.testing.assert_allclose(scores, expected, rtol=1e-6)
+    tie_order = np.lexsort((np.arange(len(df)), columns['price'], -df['battery_mah'].to_numpy()))
+    np.testing.assert_array_equal(np.argsort(ranks), tie_order)
+
+    expected_rows = np.lexsort((ranks, -scores))
+    for k in (10, None):
+        result = pc.get_recommendations(df, 1500, "Value", top_k=k)
+        np.testing.assert_array_equal(df.index.get_indexer(result.index), expected_rows[:k])
+    batch = pc.get_recommendations_batch(df, pd.DataFrame({'budget': [1500, 800], 'primary_use': "Value"}), top_k=5)
+    assert batch['phone_id'].iloc[:5].tolist() == df.index[expected_rows[:5]].tolist()
+
+
+@pytest.mark.parametrize('spec', [
+    {'weights': {'camera': 1}, 'colour': "red"},
+    {'weights': {'price': 1}},
+    {'terms': [{'expression': "__import__('os').getcwd()", 'weight': 1}]},
+    {'terms': [{'expression': "camera.real", 'weight': 1}]},
+    {'weights': {'camera': 1}, 'tie_breakers': ["min(price)"]},
+    {},
+])
+def test_invalid_profiles_are_rejected(spec):
+    with pytest.raises((ValueError, TypeError)):
+        pc.ScoringProfile("Broken", spec)
+
+
+def brute_force_frontier(df):
+    prices = df['price'].to_numpy(dtype=np.float64)
+    scores = df[pc.SCORE_COLUMNS].to_numpy(dtype=np.float64)
+    no_worse = (prices[None, :] <= prices[:, None]) & (scores[None, :, :] >= scores[:, None, :]).all(axis=2)
+    better = (prices[None, :] < prices[:, None]) | (scores[None, :, :] > scores[:, None, :]).any(axis=2)
+    return np.flatnonzero(~(no_worse & better).any(axis=1))
+
+
+def test_value_frontier_matches_brute_force():
+    for seed, score_low in ((24, 0), (25, 90)):
+        df = ingested(make_catalog(3000, seed=seed, score_low=score_low))
+        index = pc.get_catalog_index(df)
+        np.testing.assert_array_equal(index.value_frontier, brute_force_frontier(df))
+        result = pc.get_recommendations(df, 900, "Gaming", top_k=None, value_frontier=True)
+        on_frontier = index.value_frontier[df['price'].to_numpy()[index.value_frontier] <= 900]
+        assert sorted(df.index.get_indexer(result.index)) == on_frontier.tolist()
+
+
+def test_value_frontier_with_fractional_prices():
+    df = ingested(make_catalog(2000, seed=1, fractional_prices=True, max_price=400))
+    assert df['price'].dtype == np.float32
+    index = pc.get_catalog_index(df)
+    np.testing.assert_array_equal(index.value_frontier, brute_force_frontier(df))
+
+
+def test_patched_frontier_matches_full_recompute():
+    df = ingested(make_catalog(1500, seed=26))
+    df.attrs['catalog_version'] = "frontier-test"
+    source = pc.get_catalog_index(df)
+    frontier = source.value_frontier
+    updates = [dict(df.iloc[row][['name'] + pc.SCORE_COLUMNS], price=5000, brand="Apple") for row in frontier[:5]]
+    updates.append({'name': "Bargain", 'price': 201, 'camera': 99, 'battery': 99, 'performance': 99, 'display': 99,
+                    'brand': "Google"})
+    patched = pc.patch_catalog(df, updates)
+    index = pc.get_catalog_index(patched)
+    assert 'value_frontier' in index.__dict__
+    np.testing.assert_array_equal(index.value_frontier, brute_force_frontier(patched))
+
+
+def test_frontier_trace_is_capped():
+    df = ingested(make_catalog(500, seed=27))
+    rows = np.arange(500)[::-1]
+    trace = pc.frontier_trace(df, rows, limit=50)
+    assert len(trace.x) == 50 and "(50 of 500 shown)" in trace.name
+    prices = np.sort(df['price'].to_numpy())
+    assert trace.x[0] == prices[0] and trace.x[-1] == prices[-1] and (np.diff(trace.x) >= 0).all()
+    assert len(pc.frontier_trace(df, rows[:50], limit=50).x) == 50
+    assert len(pc.frontier_trace(df, rows).x) == min(500, pc.SCATTER_POINT_LIMIT)
+
+
+def test_cheaper_alternatives_with_fractional_prices():
+    df = ingested(make_catalog(1000, seed=2, fractional_prices=True, max_price=400))
+    index = pc.get_catalog_index(df)
+    prices = df['price'].to_numpy(dtype=np.float64)
+    scores = df[pc.SCORE_COLUMNS].to_numpy()
+    for profile, weights in (("Gaming", None), ("General Use", None), (pc.CUSTOM_PROFILE, {'camera': 2, 'battery': 1})):
+        if weights is None:
+            vector = pc.get_profile_registry().get(profile).weights
+            ranking = index.profile_ranking(profile)[0]
+        else:
+            vector = pc.normalize_weights(weights)
+            ranking = index.weighted_scores(np.arange(len(df)), vector)
+        for row in range(0, len(df), 7):
+            qualifies = (prices < prices[row]) & (scores[:, vector > 0] >= scores[row, vector > 0]).all(axis=1)
+            expected = np.flatnonzero(qualifies)
+            expected = expected[np.lexsort((expected, -ranking[expected]))][:pc.ALTERNATIVE_LIMIT]
+            alternatives = pc.cheaper_alternatives(df, row, profile, weights)
+            np.testing.assert_array_equal(df.index.get_indexer(alternatives.index), expected)
+
+
+def test_search_result_focuses_a_phone():
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(pc.__file__, default_timeout=60)
+    app.run()
+    next(widget for widget in app.text_input if "Search" in widget.label).input("pixel 8 pro").run()
+    focus = [button for button in app.button if button.label == "🔎 Focus"]
+    assert focus
+    focus[0].click().run()
+    assert not app.exception
+    assert app.session_state['selected_phone'] == "Google Pixel 8 Pro"
+    assert any("Google Pixel 8 Pro" in block.value and "cheaper" in block.value.lower()
+               for block in app.markdown) or any("cheaper" in caption.value for caption in app.caption)